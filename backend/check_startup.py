@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Check API cold-start time against a budget.
+
+Imports main and loads the active model in a fresh interpreter, then
+reports the time spent and any heavy libraries the serving path pulled in.
+Exits non-zero when a budget is exceeded, so it can run in CI:
+
+    python check_startup.py
+    IMPORT_TIME_BUDGET_MS=800 MODEL_LOAD_BUDGET_MS=300 python check_startup.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Libraries only needed for training or for the pickled fallback path
+HEAVY_MODULES = ["sklearn", "pandas", "joblib", "scipy", "xgboost", "matplotlib", "seaborn"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from utils.model_registry import get_bundle
+bundle = get_bundle()
+loaded = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "model_load_ms": (loaded - imported) * 1000,
+    "model_loaded": bundle is not None,
+    "engine": type(bundle.model).__name__ if bundle is not None else None,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def main():
+    import_budget = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1000"))
+    load_budget = float(os.getenv("MODEL_LOAD_BUDGET_MS", "500"))
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE % HEAVY_MODULES],
+        cwd=backend_dir, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        print("❌ Startup probe failed")
+        return 1
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    print(f"Import main:  {report['import_ms']:8.1f} ms (budget {import_budget:.0f} ms)")
+    print(f"Model load:   {report['model_load_ms']:8.1f} ms (budget {load_budget:.0f} ms)")
+    print(f"Engine:       {report['engine']}")
+    print(f"Heavy modules loaded: {', '.join(report['heavy_modules']) or 'none'}")
+
+    failed = False
+    if not report["model_loaded"]:
+        print("❌ Model did not load")
+        failed = True
+    if report["import_ms"] > import_budget:
+        print("❌ Import time over budget")
+        failed = True
+    if report["model_load_ms"] > load_budget:
+        print("❌ Model load time over budget")
+        failed = True
+    if not failed:
+        print("✅ Startup within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
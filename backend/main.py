@@ -1,15 +1,67 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import predict, model_info, train, teacher, teacher_upload
+from fastapi.responses import Response
+from routes import predict, model_info, model_admin, train, teacher, teacher_upload, history
+from utils.model_registry import get_bundle, active_version_watcher
+from utils.database import get_client, close_client, database_health, ensure_indexes, replay_spill, spill_file
+from utils.write_behind import prediction_writer
+from utils.batch_jobs import batch_jobs
+from utils.micro_batcher import prediction_batcher
+from utils.executors import inference_executor, upload_executor, password_executor
+from utils.scoring_pool import scoring_pool
+from utils.trainer import trainer
+from utils.settings import bool_env
+from utils.logger import start_logging, stop_logging
+from utils.metrics import registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load shared resources once per process."""
+    start = time.perf_counter()
+    # PRELOAD_MODEL=false defers the model load to the first prediction
+    if bool_env("PRELOAD_MODEL", True):
+        get_bundle()
+    start_logging()
+    get_client()
+    if bool_env("MONGO_CREATE_INDEXES", True):
+        # In the background so an unreachable database does not delay startup
+        threading.Thread(target=ensure_indexes, name="ensure-indexes", daemon=True).start()
+    if spill_file.has_pending():
+        # Writes spilled while the database was down before the last shutdown
+        threading.Thread(target=replay_spill, name="spill-replay", daemon=True).start()
+    prediction_writer.start()
+    prediction_batcher.start()
+    batch_jobs.start()
+    # Follow model activations made through other worker processes
+    active_version_watcher.start()
+    print(f"✓ Startup completed in {time.perf_counter() - start:.3f}s")
+    yield
+    active_version_watcher.stop()
+    prediction_batcher.stop()
+    # Flush queued predictions before the pool goes away
+    prediction_writer.stop()
+    batch_jobs.shutdown()
+    trainer.shutdown()
+    upload_executor.shutdown()
+    password_executor.shutdown()
+    scoring_pool.shutdown()
+    inference_executor.shutdown()
+    # Last, so records logged by the pools above are written too
+    stop_logging()
+    close_client()
+
 app = FastAPI(
     title="Student Performance Predictor API",
     description="Predicts student performance and manages records.",
-    version="1.2.0"
+    version="1.2.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware with explicit configuration for file downloads
@@ -31,14 +83,26 @@ app.add_middleware(
 
 app.include_router(predict.router)
 app.include_router(model_info.router)
+app.include_router(model_admin.router)
 app.include_router(train.router)
 app.include_router(teacher.router)
 app.include_router(teacher_upload.router)
+app.include_router(history.router)
 
 @app.get("/", tags=["Health"])
 def root():
     return {"message": "Student Performance Predictor API is running!"}
 
+@app.get("/health/db", tags=["Health"])
+def db_health():
+    """Database reachability, pinged at most every few seconds"""
+    return database_health()
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,167 @@
+"""Prediction History Routes"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+from typing import Optional
+from pymongo import ASCENDING, DESCENDING
+from utils.auth import get_current_teacher
+from utils.database import get_database, unavailable_error, PREDICTIONS_DB
+from utils.batch_results import HEADERS_COLLECTION, RESULTS_COLLECTION
+from utils.pagination import paginate, time_range, InvalidCursor
+
+router = APIRouter(prefix="/history", tags=["History"])
+
+# Summary fields returned in listings; fetch a single prediction for the full record
+PREDICTION_SUMMARY = {
+    "student_name": 1,
+    "roll_number": 1,
+    "predicted_score": 1,
+    "predicted_category": 1,
+    "attendance": 1,
+    "prev_cgpa": 1,
+}
+
+BATCH_SUMMARY = {
+    "filename": 1,
+    "status": 1,
+    "total_students": 1,
+    "failed_rows": 1,
+}
+
+# Fields of a stored batch row that are not part of the result itself
+BATCH_ROW_EXCLUDE = {"teacher_email": 0}
+
+PAGE_LIMIT = Query(50, ge=1, le=200, description="Items per page")
+
+def _predictions_db():
+    db = get_database(PREDICTIONS_DB)
+    if db is None:
+        raise unavailable_error()
+    return db
+
+def _page(collection, query, time_field, projection, limit, cursor):
+    try:
+        return paginate(collection, query, time_field, projection, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"History query error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read prediction history")
+
+@router.get("/students/{roll_number}", summary="Prediction history of one student")
+def student_history(
+    roll_number: str,
+    start: Optional[datetime] = Query(None, description="Earliest created_at (inclusive)"),
+    end: Optional[datetime] = Query(None, description="Latest created_at (exclusive)"),
+    limit: int = PAGE_LIMIT,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    email: str = Depends(get_current_teacher)
+):
+    """Predictions for a roll number, newest first"""
+    query = {"roll_number": roll_number}
+    query.update(time_range("created_at", start, end))
+    return _page(_predictions_db()["predictions"], query, "created_at", PREDICTION_SUMMARY, limit, cursor)
+
+@router.get("/predictions", summary="Predictions in a date range")
+def predictions_history(
+    start: Optional[datetime] = Query(None, description="Earliest created_at (inclusive)"),
+    end: Optional[datetime] = Query(None, description="Latest created_at (exclusive)"),
+    limit: int = PAGE_LIMIT,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    email: str = Depends(get_current_teacher)
+):
+    """All single predictions, newest first, optionally limited to a date range"""
+    query = time_range("created_at", start, end)
+    return _page(_predictions_db()["predictions"], query, "created_at", PREDICTION_SUMMARY, limit, cursor)
+
+@router.get("/predictions/{prediction_id}", summary="Get one full prediction record")
+def get_prediction(prediction_id: str, email: str = Depends(get_current_teacher)):
+    """Full stored record for a prediction listed by the history endpoints"""
+    try:
+        object_id = ObjectId(prediction_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    record = _predictions_db()["predictions"].find_one({"_id": object_id})
+    if record is None:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    record["id"] = str(record.pop("_id"))
+    return record
+
+@router.get("/batches", summary="CSV uploads of the current teacher")
+def teacher_batches(
+    start: Optional[datetime] = Query(None, description="Earliest processed_at (inclusive)"),
+    end: Optional[datetime] = Query(None, description="Latest processed_at (exclusive)"),
+    limit: int = PAGE_LIMIT,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    email: str = Depends(get_current_teacher)
+):
+    """Batch upload summaries for the logged-in teacher, newest first (results are not included)"""
+    query = {"teacher_email": email}
+    query.update(time_range("processed_at", start, end))
+    return _page(_predictions_db()[HEADERS_COLLECTION], query, "processed_at", BATCH_SUMMARY, limit, cursor)
+
+def _object_id(value, detail):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=detail)
+
+def _batch_rows(documents, limit, cursor_field):
+    """Trim a limit+1 fetch to one page and derive next_cursor from its last row"""
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = str(documents[-1][cursor_field])
+    for document in documents:
+        document["id"] = str(document.pop("_id"))
+        document["batch_id"] = str(document["batch_id"])
+    return {"items": documents, "next_cursor": next_cursor}
+
+@router.get("/batches/{batch_id}/results", summary="Per-student results of one CSV upload")
+def batch_results(
+    batch_id: str,
+    limit: int = PAGE_LIMIT,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    email: str = Depends(get_current_teacher)
+):
+    """Results of one of the teacher's uploads in file order"""
+    db = _predictions_db()
+    try:
+        object_id = ObjectId(batch_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if db[HEADERS_COLLECTION].find_one({"_id": object_id, "teacher_email": email}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    query = {"batch_id": object_id}
+    if cursor:
+        try:
+            query["row_index"] = {"$gt": int(cursor)}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    documents = list(
+        db[RESULTS_COLLECTION].find(query, BATCH_ROW_EXCLUDE)
+        .sort("row_index", ASCENDING)
+        .limit(limit + 1)
+    )
+    return _batch_rows(documents, limit, "row_index")
+
+@router.get("/students/{roll_number}/batch-results", summary="Batch results of one student")
+def student_batch_results(
+    roll_number: str,
+    limit: int = PAGE_LIMIT,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    email: str = Depends(get_current_teacher)
+):
+    """A student's results across the teacher's uploads, newest first"""
+    query = {"teacher_email": email, "roll_number": roll_number}
+    if cursor:
+        query["_id"] = {"$lt": _object_id(cursor, "Invalid cursor")}
+    documents = list(
+        _predictions_db()[RESULTS_COLLECTION].find(query, BATCH_ROW_EXCLUDE)
+        .sort("_id", DESCENDING)
+        .limit(limit + 1)
+    )
+    return _batch_rows(documents, limit, "_id")
@@ -0,0 +1,71 @@
+"""Model Version Administration Routes"""
+
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Header
+import hmac
+import os
+from utils.model_registry import (
+    activate_version,
+    list_versions,
+    registry_info,
+    reload_status,
+    rollback,
+    validate_version,
+    version_dir,
+)
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Check the admin token; admin endpoints are refused while ADMIN_TOKEN is unset"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin/models", tags=["Model Admin"], dependencies=[Depends(require_admin)])
+
+def _activate_in_background(version: str):
+    """Load a version off the request path; failures are kept in the reload status"""
+    try:
+        activate_version(version)
+    except Exception:
+        pass
+
+@router.get("/", summary="List stored model versions")
+def get_versions():
+    """List model versions on disk and the serving/standby bundles"""
+    return {
+        "versions": list_versions(),
+        "serving": registry_info()
+    }
+
+@router.post("/{version}/activate", status_code=202, summary="Load and activate a model version")
+def activate(version: str, background_tasks: BackgroundTasks):
+    """
+    Load a model version in the background and swap it in once ready.
+    In-flight predictions keep using the current model until the swap.
+    """
+    try:
+        validate_version(version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.exists(os.path.join(version_dir(version), "model.pkl")):
+        raise HTTPException(status_code=404, detail=f"Model version {version} not found")
+    if reload_status()["state"] == "loading":
+        raise HTTPException(status_code=409, detail="Another model version is already loading")
+
+    background_tasks.add_task(_activate_in_background, version)
+    return {"status": "loading", "version": version}
+
+@router.post("/rollback", summary="Roll back to the previous model version")
+def rollback_version():
+    """Swap the warm previous model back into service"""
+    try:
+        bundle = rollback()
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "active", "version": bundle.version}
+
+@router.get("/status", summary="Get model reload status")
+def get_reload_status():
+    """Report progress of the most recent activation"""
+    return reload_status()
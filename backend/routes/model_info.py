@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
-import joblib
+from utils.model_registry import get_bundle, registry_info
 
 router = APIRouter(prefix="/model-info", tags=["Model Info"])
 
@@ -20,9 +20,11 @@ def get_model_info():
     - Output labels
     """
     try:
-        # Try to load actual model info
-        model = joblib.load("model/model.pkl")
-        le = joblib.load("model/label_encoder.pkl")
+        # Use the shared bundle instead of unpickling the model per request
+        bundle = get_bundle()
+        if bundle is None:
+            raise RuntimeError("Model not loaded")
+        le = bundle.le
         
         return ModelInfo(
             model_name="Random Forest Classifier",
@@ -54,6 +56,11 @@ def get_model_info():
             version="2.0.0"
         )
 
+@router.get("/runtime", summary="Get loaded model runtime details")
+def get_runtime_info():
+    """Report which model bundle is serving, its load time and memory footprint."""
+    return registry_info()
+
 @router.get("/metrics", summary="Get model metrics")
 def get_metrics():
     """Get detailed model performance metrics."""
@@ -1,12 +1,18 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field, validator
-import joblib
+import asyncio
 import numpy as np
-import pandas as pd
 from utils.logger import log_prediction
+from utils.features import assemble_features
+from utils.metrics import prediction_errors, stage
+from utils.model_registry import get_bundle, loaded_bundle
+from utils.executors import inference_executor, upload_executor, password_executor, ExecutorBusy
+from utils.scoring_pool import scoring_pool
+from utils.write_behind import prediction_writer
+from utils.database import db_breaker, spill_file
+from utils.micro_batcher import prediction_batcher
+from utils.prediction_cache import prediction_cache
 from datetime import datetime
-from pymongo import MongoClient
-import os
 from typing import List, Optional
 
 router = APIRouter(prefix="/predict", tags=["Prediction"])
@@ -63,89 +69,53 @@ class PredictResponse(BaseModel):
     subject_performance: List[SubjectPerformance] = []
     study_recommendations: List[str] = []
 
-# Load model and preprocessors
-try:
-    # Get the directory of the current file and go up to backend, then to model
-    import os
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    backend_dir = os.path.dirname(current_dir)
-    model_dir = os.path.join(backend_dir, "model")
-    
-    model_path = os.path.join(model_dir, "model.pkl")
-    scaler_path = os.path.join(model_dir, "scaler.pkl")
-    le_path = os.path.join(model_dir, "label_encoder.pkl")
-    
-    model = joblib.load(model_path)
-    scaler = joblib.load(scaler_path)
-    le = joblib.load(le_path)
-    print(f"✓ Model loaded successfully from {model_path}")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    print(f"Attempted to load from: {model_path if 'model_path' in locals() else 'model/model.pkl'}")
-    model = None
-    scaler = None
-    le = None
-
-# MongoDB setup
-def get_mongo_connection():
-    try:
-        mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-        client = MongoClient(mongo_uri)
-        db = client["student_performance"]
-        return db
-    except Exception as e:
-        print(f"MongoDB connection error: {e}")
-        return None
-
 @router.post("/", response_model=PredictResponse, summary="Predict student performance")
-def predict_performance(data: PredictRequest):
+async def predict_performance(data: PredictRequest):
     """
     Predict student performance based on input features including dynamic assignments and subjects.
     Marks obtained and total marks are converted to percentages before model prediction.
+    
+    Runs on the event loop; inference happens on the micro-batcher thread
+    (or the inference executor) and persistence and logging are queued, so
+    the loop only waits on futures.
     """
     
-    if model is None or scaler is None or le is None:
-        raise HTTPException(status_code=500, detail="Model not loaded. Please ensure model.pkl exists.")
+    if loaded_bundle() is None:
+        # First request with PRELOAD_MODEL=false: load off the event loop
+        try:
+            bundle = await inference_executor.run(get_bundle)
+        except ExecutorBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        if bundle is None:
+            raise HTTPException(status_code=500, detail="Model not loaded. Please ensure model.pkl exists.")
     
     try:
         # Convert marks to percentages
-        assignment_percentage = np.mean([
-            (a.marks_obtained / a.marks_total) * 100 for a in data.assignments
-        ])
-        subject_percentage = np.mean([
-            (s.marks_obtained / s.marks_total) * 100 for s in data.subjects
-        ])
-        
-        # Internal marks approximation from assignment percentage
-        internal_marks = min(50, assignment_percentage * 0.5)
-        
-        # Create DataFrame with EXACT feature names and ORDER used during training
-        # CRITICAL: Order must match exactly: attendance, assignment_score, internal_marks, prev_cgpa, study_hours, sleep_hours
-        input_df = pd.DataFrame({
-            'attendance': [data.attendance],
-            'assignment_score': [assignment_percentage],
-            'internal_marks': [internal_marks],
-            'prev_cgpa': [data.prev_cgpa],
-            'study_hours': [data.study_hours],
-            'sleep_hours': [data.sleep_hours]
-        })
+        with stage("single", "parse"):
+            assignment_percentage = np.mean([
+                (a.marks_obtained / a.marks_total) * 100 for a in data.assignments
+            ])
+            subject_percentage = np.mean([
+                (s.marks_obtained / s.marks_total) * 100 for s in data.subjects
+            ])
         
-        # Ensure column order matches training data
-        feature_names = ['attendance', 'assignment_score', 'internal_marks', 'prev_cgpa', 'study_hours', 'sleep_hours']
-        input_df = input_df[feature_names]
+        # Feature row in the EXACT order used during training
+        # (internal marks are derived from assignments)
+        with stage("single", "featurize"):
+            features = assemble_features(
+                data.attendance,
+                assignment_percentage,
+                data.prev_cgpa,
+                data.study_hours,
+                data.sleep_hours
+            )
         
-        # Scale and predict using the DataFrame
-        X_scaled = scaler.transform(input_df)
-        pred_label = model.predict(X_scaled)[0]
-        pred_proba = model.predict_proba(X_scaled)[0]
-        pred_category = le.inverse_transform([pred_label])[0]
-        
-        # Calculate weighted score based on predicted probabilities
-        # Label classes are: ['Average', 'Excellent', 'Good', 'Poor']
-        # Assign scores: Average=55, Excellent=90, Good=75, Poor=35
-        score_mapping = {0: 55, 1: 90, 2: 75, 3: 35}  # Average, Excellent, Good, Poor
-        pred_score = float(np.dot(pred_proba, [55, 90, 75, 35]))
-        pred_score = min(100, max(0, pred_score))
+        # Scale and predict together with any concurrent requests; the score
+        # is the probability-weighted mix of Average=55, Excellent=90, Good=75, Poor=35
+        bundle, pred_category, pred_proba, pred_score = await asyncio.wrap_future(
+            prediction_batcher.submit(features)
+        )
+        le = bundle.le
         
         # Calculate subject performance flags and pass/fail status
         subject_avg = subject_percentage
@@ -221,15 +191,13 @@ def predict_performance(data: PredictRequest):
             "created_at": datetime.utcnow()
         }
         
-        # Save to MongoDB
-        db = get_mongo_connection()
-        if db is not None:
-            try:
-                db["predictions"].insert_one(record)
-            except Exception as mongo_err:
-                print(f"MongoDB insert error: {mongo_err}")
+        # Queue for MongoDB; the write-behind thread batches inserts off the request path
+        with stage("single", "persist"):
+            if not prediction_writer.submit(dict(record)):
+                prediction_errors.inc(pipeline="single", stage="persist")
         
-        log_prediction(record)
+        with stage("single", "log"):
+            log_prediction(record)
         
         return PredictResponse(
             predicted_score=round(pred_score, 2),
@@ -243,7 +211,11 @@ def predict_performance(data: PredictRequest):
             study_recommendations=study_recommendations
         )
     
+    except ExecutorBusy as e:
+        prediction_errors.inc(pipeline="single", stage="request")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
+        prediction_errors.inc(pipeline="single", stage="request")
         error_msg = f"Prediction error: {str(e)}"
         log_prediction({"error": error_msg, "data": data.dict() if data else {}})
         print(f"[ERROR] {error_msg}")
@@ -253,9 +225,24 @@ def predict_performance(data: PredictRequest):
 @router.get("/health", tags=["Health"])
 def predict_health():
     """Health check for predict route"""
+    bundle = get_bundle()
     return {
         "status": "OK",
-        "model_loaded": model is not None,
-        "scaler_loaded": scaler is not None,
-        "encoder_loaded": le is not None
+        "model_loaded": bundle is not None,
+        "scaler_loaded": bundle is not None,
+        "encoder_loaded": bundle is not None,
+        "model_version": bundle.version if bundle is not None else None,
+        "persistence": prediction_writer.stats(),
+        "database": {
+            "circuit": db_breaker.stats(),
+            "spill": spill_file.stats()
+        },
+        "micro_batching": prediction_batcher.stats(),
+        "executors": {
+            "inference": inference_executor.stats(),
+            "csv_upload": upload_executor.stats(),
+            "password_hash": password_executor.stats()
+        },
+        "scoring_pool": scoring_pool.stats(),
+        "cache": prediction_cache.stats()
     }
@@ -2,15 +2,23 @@
 
 from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel, EmailStr, Field
-from pymongo import MongoClient
-import os
+from pymongo.errors import DuplicateKeyError, PyMongoError
 from passlib.context import CryptContext
-from utils.jwt_handler import create_access_token, decode_token
+from starlette.concurrency import run_in_threadpool
+from utils.jwt_handler import create_access_token
+from utils.auth import get_current_teacher, bearer_token, revoke_token, teacher_profiles
+from utils.database import get_database, db_call, unavailable_error, TEACHERS_DB, UNAVAILABLE_ERRORS
+from utils.executors import password_executor, ExecutorBusy
+from utils.settings import int_env
 from datetime import timedelta, datetime, timezone
 
 router = APIRouter(prefix="/teacher", tags=["Teacher"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost for new hashes; hashes made with another cost are replaced
+# on the teacher's next successful login
+BCRYPT_ROUNDS = int_env("BCRYPT_ROUNDS", 12)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 class TeacherRegister(BaseModel):
     email: EmailStr = Field(..., description="Teacher email")
@@ -28,17 +36,8 @@ class TokenResponse(BaseModel):
     teacher_email: str
 
 def get_mongo_connection():
-    """Get MongoDB connection"""
-    try:
-        mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-        # Test connection
-        client.admin.command('ping')
-        db = client["student_predictor"]
-        return db
-    except Exception as e:
-        print(f"MongoDB connection error: {e}")
-        return None
+    """Get the teachers database from the shared connection pool"""
+    return get_database(TEACHERS_DB)
 
 def hash_password(password: str):
     """Hash password"""
@@ -48,44 +47,49 @@ def verify_password(plain_password: str, hashed_password: str):
     """Verify password"""
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_current_teacher(authorization: str = Header(None)):
-    """Get current teacher from token"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-    
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Verify password; also returns a new hash when the stored one uses an outdated cost"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def _store_rehash(db, email: str, new_hash: str):
     try:
-        token = authorization.split(" ")[1] if " " in authorization else authorization
-        payload = decode_token(token)
-        if not payload:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-        return payload.get("email")
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        db_call(db["teachers"].update_one, {"email": email}, {"$set": {"password_hash": new_hash}})
+    except Exception as e:
+        print(f"Password rehash error: {e}")
 
 @router.post("/register", response_model=TokenResponse, summary="Register new teacher")
-def register_teacher(data: TeacherRegister):
-    """Register a new teacher account"""
+async def register_teacher(data: TeacherRegister):
+    """
+    Register a new teacher account.
+    
+    Database calls run on the threadpool and bcrypt on the password
+    executor, so neither blocks the event loop.
+    """
     try:
         db = get_mongo_connection()
         if db is None:
-            raise HTTPException(status_code=500, detail="Database connection failed")
+            raise unavailable_error()
         
         # Check if teacher already exists
-        existing = db["teachers"].find_one({"email": data.email})
+        existing = await run_in_threadpool(db_call, db["teachers"].find_one, {"email": data.email})
         if existing:
             raise HTTPException(status_code=400, detail="Teacher with this email already exists")
         
         # Create teacher record
         teacher_record = {
             "email": data.email,
-            "password_hash": hash_password(data.password),
+            "password_hash": await password_executor.run(hash_password, data.password),
             "full_name": data.full_name,
             "school_name": data.school_name,
             "created_at": datetime.now(timezone.utc),
             "is_active": True
         }
         
-        result = db["teachers"].insert_one(teacher_record)
+        try:
+            await run_in_threadpool(db_call, db["teachers"].insert_one, teacher_record)
+        except DuplicateKeyError:
+            # Registered concurrently, after the check above; the unique index caught it
+            raise HTTPException(status_code=400, detail="Teacher with this email already exists")
         
         # Create access token
         access_token = create_access_token(
@@ -99,26 +103,51 @@ def register_teacher(data: TeacherRegister):
         )
     except HTTPException:
         raise
+    except UNAVAILABLE_ERRORS as e:
+        raise unavailable_error(str(e))
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Registration error: {e}")
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
 @router.post("/login", response_model=TokenResponse, summary="Login teacher")
-def login_teacher(data: TeacherLogin):
-    """Login teacher with email and password"""
+async def login_teacher(data: TeacherLogin):
+    """
+    Login teacher with email and password.
+    
+    bcrypt runs on the bounded password executor; when its queue is full
+    the login is refused with 503 rather than waiting behind the others.
+    """
     db = get_mongo_connection()
     if db is None:
-        raise HTTPException(status_code=500, detail="Database connection failed")
+        raise unavailable_error()
     
     # Find teacher
-    teacher = db["teachers"].find_one({"email": data.email})
+    try:
+        teacher = await run_in_threadpool(db_call, db["teachers"].find_one, {"email": data.email})
+    except UNAVAILABLE_ERRORS as e:
+        raise unavailable_error(str(e))
+    except PyMongoError as e:
+        print(f"Login database error: {e}")
+        raise HTTPException(status_code=500, detail="Database connection failed")
     if not teacher:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Verify password
-    if not verify_password(data.password, teacher["password_hash"]):
+    try:
+        valid, new_hash = await password_executor.run(
+            verify_and_update_password, data.password, teacher["password_hash"]
+        )
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this password was stored
+        await run_in_threadpool(_store_rehash, db, data.email, new_hash)
+    
     # Create access token
     access_token = create_access_token(
         data={"email": data.email, "full_name": teacher.get("full_name", "")},
@@ -132,10 +161,8 @@ def login_teacher(data: TeacherLogin):
 
 @router.get("/me", summary="Get current teacher info")
 def get_teacher_info(email: str = Depends(get_current_teacher)):
-    """Get current logged-in teacher info"""
-    db = get_mongo_connection()
-    teacher = db["teachers"].find_one({"email": email})
-    
+    """Get current logged-in teacher info (cached for TEACHER_PROFILE_TTL_SECONDS)"""
+    teacher = teacher_profiles.get(email)
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
     
@@ -145,3 +172,9 @@ def get_teacher_info(email: str = Depends(get_current_teacher)):
         "school_name": teacher.get("school_name", ""),
         "created_at": teacher.get("created_at")
     }
+
+@router.post("/logout", summary="Logout teacher")
+def logout_teacher(authorization: str = Header(None)):
+    """Revoke the bearer token so it cannot be used again before it expires"""
+    revoke_token(bearer_token(authorization))
+    return {"status": "logged_out"}
@@ -1,58 +1,45 @@
 """Teacher CSV Processing Route"""
 
-from fastapi import APIRouter, HTTPException, File, UploadFile, Header, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, File, UploadFile, Depends, Query
+from fastapi.responses import StreamingResponse, JSONResponse
 import csv
 import io
-import joblib
-import numpy as np
-import pandas as pd
+import itertools
 import os
-from pymongo import MongoClient
-from datetime import datetime
-from utils.jwt_handler import decode_token
+from utils.auth import get_current_teacher
+from utils.model_registry import get_bundle
+from utils.inference import score_rows
+from utils.metrics import prediction_errors, stage
+from utils.settings import int_env
+from utils.batch_jobs import batch_jobs
+from utils.batch_results import create_batch, store_results, finish_batch
+from utils.executors import upload_executor, ExecutorBusy
+from utils.scoring_pool import scoring_pool
 import json
 
 router = APIRouter(prefix="/teacher/upload", tags=["Teacher"])
 
-def get_current_teacher_email(authorization: str = Header(None)):
-    """Extract teacher email from JWT token"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-    
-    try:
-        token = authorization.split(" ")[1] if " " in authorization else authorization
-        payload = decode_token(token)
-        if not payload:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-        return payload.get("email")
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-def load_ml_model():
-    """Load trained ML model"""
-    try:
-        # Get the correct path to model files
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        backend_dir = os.path.dirname(current_dir)
-        model_dir = os.path.join(backend_dir, "model")
-        
-        model_path = os.path.join(model_dir, "model.pkl")
-        scaler_path = os.path.join(model_dir, "scaler.pkl")
-        le_path = os.path.join(model_dir, "label_encoder.pkl")
-        
-        model = joblib.load(model_path)
-        scaler = joblib.load(scaler_path)
-        le = joblib.load(le_path)
-        return model, scaler, le
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        return None, None, None
+STREAM_BATCH_SIZE = int_env("CSV_STREAM_BATCH_SIZE", 1000)
+
+RESULT_CSV_COLUMNS = [
+    "student_name",
+    "roll_number",
+    "attendance",
+    "avg_assignment_marks",
+    "avg_subject_marks",
+    "prev_cgpa",
+    "study_hours",
+    "sleep_hours",
+    "predicted_score",
+    "predicted_category",
+    "pass_fail_status",
+    "error"
+]
 
 @router.post("/csv", summary="Upload and process CSV for batch predictions")
 async def process_csv(
     file: UploadFile = File(...),
-    email: str = Depends(get_current_teacher_email)
+    email: str = Depends(get_current_teacher)
 ):
     """
     Process CSV file with student data and generate batch predictions.
@@ -65,121 +52,305 @@ async def process_csv(
         raise HTTPException(status_code=400, detail="File must be in CSV format")
     
     try:
-        # Read CSV file
+        # Read CSV file, then parse, score and store it on the upload
+        # executor so the event loop keeps serving other requests
         contents = await file.read()
-        csv_text = contents.decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(csv_text))
+        return await upload_executor.run(_score_upload, contents, email, file.filename)
         
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
+
+def _score_upload(contents, email, filename):
+    """
+    Executor-side work of POST /csv: decode, score the whole upload as one
+    matrix and store it. The JSON response is rendered here as well, since
+    encoding thousands of results would otherwise run on the event loop.
+    """
+    csv_text = contents.decode('utf-8')
+    csv_reader = csv.DictReader(io.StringIO(csv_text))
+    
+    if not csv_reader.fieldnames:
+        raise HTTPException(status_code=400, detail="Invalid CSV format")
+    
+    # Load model
+    bundle = get_bundle()
+    if bundle is None:
+        raise HTTPException(status_code=500, detail="ML model not loaded")
+    
+    results = score_rows(csv_reader, bundle)
+    
+    # Save results to MongoDB: a batch header plus one document per student.
+    # While the database is down they are spilled and written later.
+    failed_rows = sum(1 for r in results if "error" in r)
+    with stage("batch", "persist"):
+        batch_id = create_batch(email, filename)
+        try:
+            written = store_results(batch_id, email, 0, results)
+        except Exception:
+            prediction_errors.inc(len(results), pipeline="batch", stage="persist")
+            finish_batch(batch_id, "failed", len(results), failed_rows)
+            raise
+        finish_batch(batch_id, "completed", len(results), failed_rows)
+    
+    return JSONResponse({
+        "status": "success",
+        "total_processed": len(results),
+        "batch_id": str(batch_id),
+        "deferred": not written,
+        "results": results
+    })
+
+def _store_batch(batch_id, email, first_row, results, summary):
+    """Store one batch of results as per-student documents so nothing grows with the upload"""
+    if batch_id is None:
+        summary["stored"] = False
+        return
+    try:
+        with stage("batch", "persist"):
+            if not store_results(batch_id, email, first_row, results):
+                summary["deferred"] = True
+    except Exception as e:
+        prediction_errors.inc(len(results), pipeline="batch", stage="persist")
+        print(f"MongoDB insert error: {e}")
+        summary["stored"] = False
+
+def _format_csv_rows(results, include_header):
+    """Render results as CSV text for chunked CSV responses"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=RESULT_CSV_COLUMNS, extrasaction="ignore")
+    if include_header:
+        writer.writeheader()
+    writer.writerows(results)
+    return output.getvalue()
+
+def _iter_scored_batches(csv_reader, bundle, email, filename, batch_size, summary):
+    """
+    Score the upload batch by batch, storing each batch as it is produced.
+    
+    Yields each list of results once it is stored; totals and the batch id
+    are written into the summary dict so callers can report them once
+    iteration finishes. The batch header always gets a final status: if the
+    consumer stops early (a streaming client disconnects) it is marked
+    partial, and failed if scoring raises.
+    """
+    batch_id = None
+    try:
+        batch_id = create_batch(email, filename)
+    except Exception as e:
+        print(f"MongoDB insert error: {e}")
+
+    summary.update({"total_processed": 0, "failed_rows": 0, "batch_id": batch_id,
+                    "stored": batch_id is not None, "deferred": False})
+    status = "failed"
+    try:
+        while True:
+            rows = list(itertools.islice(csv_reader, batch_size))
+            if not rows:
+                break
+            results = score_rows(rows, bundle)
+            first_row = summary["total_processed"]
+            summary["total_processed"] += len(results)
+            summary["failed_rows"] += sum(1 for r in results if "error" in r)
+
+            # Stored first: a client may disconnect as soon as it has the batch
+            _store_batch(batch_id, email, first_row, results, summary)
+            try:
+                yield results
+            except GeneratorExit:
+                status = "partial"
+                raise
+        status = "completed" if summary["stored"] else "partial"
+    finally:
+        if batch_id is not None:
+            try:
+                finish_batch(batch_id, status, summary["total_processed"], summary["failed_rows"])
+            except Exception as e:
+                print(f"MongoDB update error: {e}")
+
+def _summary_line(summary):
+    batch_id = summary.get("batch_id")
+    return json.dumps({
+        "status": "success",
+        "total_processed": summary.get("total_processed", 0),
+        "failed_rows": summary.get("failed_rows", 0),
+        "batch_id": str(batch_id) if batch_id is not None else None,
+        "stored": summary.get("stored", False),
+        "deferred": summary.get("deferred", False)
+    }) + "\n"
+
+def _stream_predictions(csv_reader, bundle, email, filename, output_format, batch_size):
+    """Yield each scored batch as NDJSON or CSV text as soon as it is ready"""
+    summary = {}
+    first = True
+    for results in _iter_scored_batches(csv_reader, bundle, email, filename, batch_size, summary):
+        if output_format == "csv":
+            yield _format_csv_rows(results, include_header=first)
+        else:
+            yield "".join(json.dumps(r) + "\n" for r in results)
+        first = False
+
+    if output_format == "csv":
+        if first:
+            yield _format_csv_rows([], include_header=True)
+    else:
+        yield _summary_line(summary)
+
+@router.post("/csv/stream", summary="Upload a large CSV and stream predictions back")
+def process_csv_stream(
+    file: UploadFile = File(...),
+    output_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    email: str = Depends(get_current_teacher)
+):
+    """
+    Stream batch predictions for arbitrarily large CSV files.
+    
+    The upload is read incrementally and scored in fixed-size batches, so
+    peak memory does not grow with the file. Results are streamed back as
+    NDJSON (one result per line plus a final summary line) or as CSV, and
+    stored one document per student as each batch is scored.
+    """
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be in CSV format")
+    
+    bundle = get_bundle()
+    if bundle is None:
+        raise HTTPException(status_code=500, detail="ML model not loaded")
+    
+    text_stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    csv_reader = csv.DictReader(text_stream)
+    try:
         if not csv_reader.fieldnames:
             raise HTTPException(status_code=400, detail="Invalid CSV format")
-        
-        # Load model
-        model, scaler, le = load_ml_model()
-        if not model:
-            raise HTTPException(status_code=500, detail="ML model not loaded")
-        
-        results = []
-        
-        for row in csv_reader:
-            try:
-                # Extract basic fields
-                student_name = row.get("student_name", "Unknown")
-                roll_number = row.get("roll_number", "N/A")
-                attendance = float(row.get("attendance", 0))
-                prev_cgpa = float(row.get("prev_cgpa", 0))
-                study_hours = float(row.get("study_hours", 0))
-                sleep_hours = float(row.get("sleep_hours", 0))
-                
-                # Extract subject marks (all columns with "subject" prefix)
-                subject_marks = [float(v) for k, v in row.items() if k.startswith("subject") and v]
-                
-                # Extract assignment marks (all columns with "assignment" prefix)
-                assignment_marks = [float(v) for k, v in row.items() if k.startswith("assignment") and v]
-                
-                if not subject_marks or not assignment_marks:
-                    results.append({
-                        "student_name": student_name,
-                        "roll_number": roll_number,
-                        "error": "Missing subject or assignment marks"
-                    })
-                    continue
-                
-                # Calculate averages
-                avg_assignment = np.mean(assignment_marks)
-                avg_subject = np.mean(subject_marks)
-                internal_marks = min(50, avg_assignment * 0.5)
-                
-                # Create DataFrame with EXACT feature names matching training data
-                input_df = pd.DataFrame({
-                    'attendance': [attendance],
-                    'assignment_score': [avg_assignment],
-                    'internal_marks': [internal_marks],
-                    'prev_cgpa': [prev_cgpa],
-                    'study_hours': [study_hours],
-                    'sleep_hours': [sleep_hours]
-                })
-                
-                # Ensure column order matches training data
-                feature_names = ['attendance', 'assignment_score', 'internal_marks', 'prev_cgpa', 'study_hours', 'sleep_hours']
-                input_df = input_df[feature_names]
-                
-                X_scaled = scaler.transform(input_df)
-                pred_label = model.predict(X_scaled)[0]
-                pred_proba = model.predict_proba(X_scaled)[0]
-                pred_category = le.inverse_transform([pred_label])[0]
-                
-                # Calculate score with 4 classes: Average=55, Excellent=90, Good=75, Poor=35
-                pred_score = float(np.dot(pred_proba, [55, 90, 75, 35]))
-                pred_score = min(100, max(0, pred_score))
-                
-                # Determine pass/fail based on average subject marks (>= 40% = PASS)
-                pass_fail = "PASS" if avg_subject >= 40 else "FAIL"
-                
-                results.append({
-                    "student_name": student_name,
-                    "roll_number": roll_number,
-                    "attendance": attendance,
-                    "avg_assignment_marks": round(avg_assignment, 2),
-                    "avg_subject_marks": round(avg_subject, 2),
-                    "prev_cgpa": prev_cgpa,
-                    "study_hours": study_hours,
-                    "sleep_hours": sleep_hours,
-                    "predicted_score": round(pred_score, 2),
-                    "predicted_category": pred_category,
-                    "pass_fail_status": pass_fail,
-                    "probabilities": {
-                        le.classes_[i]: round(float(pred_proba[i]), 4)
-                        for i in range(len(le.classes_))
-                    }
-                })
-                
-            except ValueError as e:
-                results.append({
-                    "student_name": row.get("student_name", "Unknown"),
-                    "roll_number": row.get("roll_number", "N/A"),
-                    "error": f"Invalid data format: {str(e)}"
-                })
-                continue
-        
-        # Save results to MongoDB
-        db = MongoClient(os.getenv("MONGO_URI")).get_database("student_performance")
-        batch_record = {
-            "teacher_email": email,
-            "filename": file.filename,
-            "total_students": len(results),
-            "processed_at": datetime.utcnow(),
-            "results": results
-        }
-        db["batch_predictions"].insert_one(batch_record)
-        
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded")
+    
+    media_type = "text/csv" if output_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_predictions(csv_reader, bundle, email, file.filename, output_format, STREAM_BATCH_SIZE),
+        media_type=media_type
+    )
+
+def _job_batch_size(rows_total):
+    """
+    Rows scored per batch by a background job.
+    
+    Jobs large enough for the scoring pool use batches of its minimum size,
+    so they are split across the pool's processes; streaming keeps small
+    batches because the client is waiting on each one.
+    """
+    if scoring_pool.enabled and rows_total >= scoring_pool.min_rows:
+        return max(STREAM_BATCH_SIZE, scoring_pool.min_rows)
+    return STREAM_BATCH_SIZE
+
+def _run_upload_job(progress, input_path, result_path, email, filename, batch_size=STREAM_BATCH_SIZE):
+    """Worker-side processing of a queued upload; results are written as NDJSON"""
+    bundle = get_bundle()
+    if bundle is None:
+        raise RuntimeError("ML model not loaded")
+    
+    summary = {}
+    with open(input_path, encoding="utf-8", newline="") as source, open(result_path, "w", encoding="utf-8") as out:
+        csv_reader = csv.DictReader(source)
+        if not csv_reader.fieldnames:
+            raise ValueError("Invalid CSV format")
+        for results in _iter_scored_batches(csv_reader, bundle, email, filename, batch_size, summary):
+            out.write("".join(json.dumps(r) + "\n" for r in results))
+            if progress is not None:
+                if summary.get("batch_id") is not None:
+                    progress.set_batch_id(summary["batch_id"])
+                progress.advance(len(results), sum(1 for r in results if "error" in r))
+    return summary
+
+def _get_owned_job(job_id, email):
+    job = batch_jobs.get(job_id)
+    if job is None or job["owner"] != email:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs", status_code=202, summary="Queue a CSV upload for background processing")
+def create_upload_job(
+    file: UploadFile = File(...),
+    email: str = Depends(get_current_teacher)
+):
+    """
+    Save the upload and process it on the batch worker pool.
+    
+    Returns a job id immediately; poll /teacher/upload/jobs/{job_id} for
+    progress and download the finished file from its /result endpoint.
+    """
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be in CSV format")
+    if get_bundle() is None:
+        raise HTTPException(status_code=500, detail="ML model not loaded")
+    if not batch_jobs.has_capacity():
+        raise HTTPException(status_code=503, detail="Too many batch jobs pending, try again later")
+    
+    job_id, input_path, rows_total = batch_jobs.save_upload(file.file)
+    filename = file.filename
+    batch_size = _job_batch_size(rows_total)
+    try:
+        job = batch_jobs.submit(
+            job_id,
+            lambda progress, src, dst: _run_upload_job(progress, src, dst, email, filename, batch_size),
+            owner=email,
+            filename=filename,
+            rows_total=rows_total,
+            input_path=input_path
+        )
+    except ExecutorBusy as e:
+        os.remove(input_path)
+        raise HTTPException(status_code=503, detail=str(e))
+    job["status_url"] = f"{router.prefix}/jobs/{job_id}"
+    job["result_url"] = f"{router.prefix}/jobs/{job_id}/result"
+    return job
+
+@router.get("/jobs/{job_id}", summary="Get progress of a CSV processing job")
+def get_upload_job(job_id: str, email: str = Depends(get_current_teacher)):
+    """Report rows processed, row errors and estimated time remaining"""
+    _get_owned_job(job_id, email)
+    return batch_jobs.describe(job_id)
+
+def _iter_result_csv(result_path, batch_size):
+    """Convert the stored NDJSON result file to CSV without loading it all"""
+    with open(result_path, encoding="utf-8") as f:
+        first = True
+        while True:
+            lines = list(itertools.islice(f, batch_size))
+            if not lines and not first:
+                break
+            yield _format_csv_rows([json.loads(line) for line in lines], include_header=first)
+            first = False
+
+@router.get("/jobs/{job_id}/result", summary="Download the results of a finished job")
+def get_upload_job_result(
+    job_id: str,
+    output_format: str = Query("csv", alias="format", pattern="^(csv|json)$"),
+    email: str = Depends(get_current_teacher)
+):
+    """Download results as CSV, or as JSON in the same shape as /teacher/upload/csv"""
+    job = _get_owned_job(job_id, email)
+    if job["status"] == "failed":
+        raise HTTPException(status_code=409, detail=f"Job failed: {job['error']}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail="Job is not finished yet")
+    
+    if output_format == "json":
+        with open(job["result_path"], encoding="utf-8") as f:
+            results = [json.loads(line) for line in f]
         return {
             "status": "success",
             "total_processed": len(results),
             "results": results
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
+    
+    download_name = job["filename"].rsplit(".", 1)[0] + "_predictions.csv"
+    return StreamingResponse(
+        _iter_result_csv(job["result_path"], STREAM_BATCH_SIZE),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={download_name}"}
+    )
 
 @router.get("/download-template", summary="Download CSV template")
 async def download_template():
@@ -1,25 +1,95 @@
-from fastapi import APIRouter, HTTPException
+"""Model Retraining Routes"""
+
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+from routes.model_admin import require_admin
+from utils.auth import get_current_teacher
+from utils.database import insert_or_spill, PREDICTIONS_DB
+from utils.dataset_store import performance_category
+from utils.features import internal_marks
+from utils.model_registry import read_active_version, read_metadata
+from utils.trainer import trainer, TrainingInProgress, LABELED_COLLECTION, WARM_START_TREES
 
 router = APIRouter(prefix="/train", tags=["Training"])
 
-@router.post("/", summary="Retrain the model")
-def retrain_model():
+class TrainRequest(BaseModel):
+    warm_start: bool = Field(default=True, description="Add trees to the active forest when it is compatible")
+    add_trees: int = Field(default=WARM_START_TREES, ge=1, le=1000, description="Trees added by a warm start")
+    include_labeled: bool = Field(default=True, description="Append submitted labeled records first")
+    activate: bool = Field(default=False, description="Activate the new version once it is saved")
+
+class LabeledRecord(BaseModel):
+    attendance: float = Field(..., ge=0, le=100, description="Attendance percentage (0-100)")
+    assignment_score: float = Field(..., ge=0, le=100, description="Assignment percentage (0-100)")
+    internal_marks: Optional[float] = Field(default=None, ge=0, le=50, description="Internal marks (0-50); derived from assignment_score if omitted")
+    prev_cgpa: float = Field(..., ge=0, le=10, description="Previous semester CGPA (0-10)")
+    study_hours: float = Field(..., ge=0, le=24, description="Study hours per day (0-24)")
+    sleep_hours: float = Field(..., ge=0, le=24, description="Sleep hours per day (0-24)")
+    final_score: float = Field(..., ge=0, le=100, description="Actual final score (0-100)")
+
+class LabeledRecords(BaseModel):
+    records: List[LabeledRecord] = Field(..., min_items=1, max_items=10000, description="Students with known outcomes")
+
+@router.post("/", status_code=202, summary="Retrain the model", dependencies=[Depends(require_admin)])
+def retrain_model(request: Optional[TrainRequest] = None):
     """
-    Endpoint to retrain the model with new data.
-    Currently not implemented in demo version.
+    Start a retraining run in a background process.
+    The result is saved as a new model version; poll /train/status for progress.
     """
-    return {
-        "message": "Retraining not implemented in demo version.",
-        "status": "pending",
-        "instruction": "Run the training.ipynb notebook to retrain the model."
-    }
+    request = request or TrainRequest()
+    try:
+        return trainer.start(
+            warm_start=request.warm_start,
+            add_trees=request.add_trees,
+            include_labeled=request.include_labeled,
+            activate=request.activate
+        )
+    except TrainingInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        print(f"Training start error: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not start training: {str(e)}")
 
 @router.get("/status", summary="Get training status")
 def get_training_status():
-    """Get the status of model training."""
+    """Progress of the current or last run, plus the metrics of the active model."""
+    status = trainer.status()
+    active_version = read_active_version()
+    metadata = read_metadata(active_version)
+    # Fields of the original status response, for existing clients
+    status["last_trained"] = metadata.get("created_at")
+    status["status"] = status["state"] if status["state"] != "idle" else "completed"
+    status["samples_used"] = metadata.get("training_samples")
+    status["model_version"] = active_version
+    status["active_metrics"] = metadata.get("metrics")
+    return status
+
+@router.post("/records", summary="Submit labeled records for retraining")
+def add_labeled_records(request: LabeledRecords, email: str = Depends(get_current_teacher)):
+    """
+    Store students whose final score is known.
+    They are added to the training dataset by the next retraining run.
+    """
+    now = datetime.utcnow()
+    documents = []
+    for record in request.records:
+        document = record.dict()
+        if document["internal_marks"] is None:
+            document["internal_marks"] = internal_marks(record.assignment_score)
+        document["performance"] = performance_category(record.final_score)
+        document["teacher_email"] = email
+        document["created_at"] = now
+        documents.append(document)
+
+    try:
+        written = insert_or_spill(PREDICTIONS_DB, LABELED_COLLECTION, documents)
+    except Exception as e:
+        print(f"Labeled record error: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not store records: {str(e)}")
     return {
-        "last_trained": "2025-11-18",
-        "status": "completed",
-        "samples_used": 500,
-        "model_version": "1.0.0"
+        "message": "Labeled records stored",
+        "records": len(documents),
+        "deferred": not written
     }
@@ -0,0 +1,47 @@
+"""
+Digests tying compiled model artifacts to the pickles they were built from.
+
+forest/ and preprocessing.npz are derived from model.pkl and the pickled
+scaler and encoder next to them. Each records the digest of its source
+pickles when exported, and load_bundle only serves a compiled artifact
+while those pickles still match. A model.pkl replaced by hand or a failed
+export then falls back to the pickles instead of serving two models.
+"""
+
+import hashlib
+import os
+from typing import Optional
+
+FOREST_SOURCES = ("model.pkl",)
+PREPROCESSING_SOURCES = ("scaler.pkl", "label_encoder.pkl")
+
+
+def sources_digest(model_dir: str, names) -> Optional[str]:
+    """SHA-256 over the named files in model_dir; None if none of them exist."""
+    digest = hashlib.sha256()
+    found = False
+    for name in names:
+        path = os.path.join(model_dir, name)
+        if not os.path.exists(path):
+            continue
+        found = True
+        digest.update(name.encode() + b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest() if found else None
+
+
+def is_current(model_dir: str, artifact: str, recorded: Optional[str], names) -> bool:
+    """
+    Whether a compiled artifact was built from the pickles next to it.
+
+    Without any of the source pickles (a compiled-only deployment) there is
+    nothing to disagree with, so the artifact is served.
+    """
+    current = sources_digest(model_dir, names)
+    if current is None or recorded == current:
+        return True
+    print(f"Ignoring {artifact} in {model_dir}: not compiled from the current {', '.join(names)}; "
+          f"recompile with: python -m utils.flat_forest {model_dir}")
+    return False
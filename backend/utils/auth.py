@@ -0,0 +1,224 @@
+"""
+Authentication dependency shared by the teacher routes.
+
+get_current_teacher verifies the bearer token once and keeps the payload
+in a bounded LRU cache until the token's exp, so dashboards that poll
+with the same token skip signature verification on later requests.
+
+Tokens are revoked (e.g. on logout) by their SHA-256 digest. Revocations
+are stored in MongoDB and every worker reloads the unexpired ones at
+most every AUTH_REVOCATION_REFRESH_SECONDS, so a revoked token stops
+working at once in the worker that revoked it and within that interval
+elsewhere. The whole set is reloaded rather than only records newer than
+the last one seen: revoked_at comes from each worker's clock, and a
+record replayed from a spill file carries its original time, so either
+could land behind a watermark and be missed for good.
+
+Teacher profiles for /teacher/me are cached for TEACHER_PROFILE_TTL_SECONDS.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from utils.database import (
+    get_database, db_call, insert_or_spill, unavailable_error, TEACHERS_DB, UNAVAILABLE_ERRORS,
+)
+from utils.jwt_handler import decode_token
+from utils.settings import int_env, float_env
+
+REVOKED_COLLECTION = "revoked_tokens"
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def bearer_token(authorization: Optional[str]) -> str:
+    """Token from an "Authorization: Bearer <token>" header (a bare token is accepted too)."""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Missing authorization header")
+    return authorization.split(" ")[1] if " " in authorization else authorization
+
+
+class TokenCache:
+    """LRU cache of verified token payloads, each valid until the token's exp."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max(0, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, digest: str) -> Optional[dict]:
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is not None and payload["exp"] > time.time():
+                self._entries.move_to_end(digest)
+                self._stats["hits"] += 1
+                return payload
+            if payload is not None:
+                del self._entries[digest]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, digest: str, payload: dict):
+        # Tokens without an exp never expire on their own; do not cache them
+        if self.max_entries == 0 or not isinstance(payload.get("exp"), (int, float)):
+            return
+        with self._lock:
+            self._entries[digest] = payload
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def discard(self, digest: str):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+class RevocationList:
+    """Digests of revoked tokens, mirrored from MongoDB."""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._revoked = {}  # digest -> exp (epoch seconds)
+        # Revoked by this worker; kept until exp in case the record is still spilled
+        self._local = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = 0.0
+
+    def is_revoked(self, digest: str) -> bool:
+        self._maybe_refresh()
+        return digest in self._revoked
+
+    def revoke(self, digest: str, email: str, exp: float):
+        """Revoke a token here and record it for the other workers."""
+        with self._lock:
+            self._revoked[digest] = exp
+            self._local[digest] = exp
+        insert_or_spill(TEACHERS_DB, REVOKED_COLLECTION, [{
+            "token_hash": digest,
+            "email": email,
+            "revoked_at": datetime.utcnow(),
+            # TTL index: the record is removed once the token has expired anyway
+            "expires_at": datetime.fromtimestamp(exp, timezone.utc).replace(tzinfo=None)
+        }])
+
+    def _maybe_refresh(self):
+        if time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return
+        # One thread reloads; the others keep using the current list
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refreshed_at = time.monotonic()
+            db = get_database(TEACHERS_DB)
+            if db is None:
+                return
+            now = time.time()
+            cutoff = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None)
+            records = db_call(lambda: list(db[REVOKED_COLLECTION].find(
+                {"expires_at": {"$gt": cutoff}},
+                {"_id": 0, "token_hash": 1, "expires_at": 1}
+            )))
+            revoked = {
+                record["token_hash"]: record["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+                for record in records
+            }
+            with self._lock:
+                self._local = {d: exp for d, exp in self._local.items() if exp > now}
+                revoked.update(self._local)
+                self._revoked = revoked
+        except Exception as e:
+            print(f"Token revocation refresh error: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def stats(self) -> dict:
+        return {"revoked": len(self._revoked), "refresh_seconds": self.refresh_seconds}
+
+
+class ProfileCache:
+    """Short-TTL cache of teacher documents (without the password hash)."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, email: str) -> Optional[dict]:
+        """Cached profile, loading it on a miss; None if the teacher does not exist."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        db = get_database(TEACHERS_DB)
+        if db is None:
+            raise unavailable_error()
+        try:
+            teacher = db_call(db["teachers"].find_one, {"email": email}, {"password_hash": 0})
+        except UNAVAILABLE_ERRORS as e:
+            raise unavailable_error(str(e))
+        if teacher is not None and self.ttl_seconds > 0:
+            with self._lock:
+                self._entries[email] = (teacher, now + self.ttl_seconds)
+                if len(self._entries) > 10000:
+                    # Drop expired entries so the dict does not grow without bound
+                    self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+        return teacher
+
+    def invalidate(self, email: str):
+        with self._lock:
+            self._entries.pop(email, None)
+
+
+token_cache = TokenCache(int_env("AUTH_TOKEN_CACHE_SIZE", 10000))
+revocations = RevocationList(float_env("AUTH_REVOCATION_REFRESH_SECONDS", 5))
+teacher_profiles = ProfileCache(float_env("TEACHER_PROFILE_TTL_SECONDS", 60))
+
+
+def verify_token(token: str) -> dict:
+    """Payload of a valid, unrevoked token; raises 401 otherwise."""
+    digest = token_digest(token)
+    if revocations.is_revoked(digest):
+        token_cache.discard(digest)
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = decode_token(token)
+        if not payload or not payload.get("email"):
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        token_cache.put(digest, payload)
+    return payload
+
+
+def get_current_teacher(authorization: str = Header(None)) -> str:
+    """FastAPI dependency: email of the teacher the bearer token belongs to."""
+    return verify_token(bearer_token(authorization))["email"]
+
+
+def revoke_token(token: str):
+    """Revoke a token (logout); it is rejected from now on, even before its exp."""
+    payload = verify_token(token)
+    digest = token_digest(token)
+    token_cache.discard(digest)
+    revocations.revoke(digest, payload["email"], payload.get("exp") or time.time() + 86400)
+    teacher_profiles.invalidate(payload["email"])
+
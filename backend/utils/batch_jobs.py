@@ -0,0 +1,343 @@
+"""
+Background batch jobs for large CSV uploads.
+
+Uploads are saved to disk and processed by a small worker pool while the
+client polls for progress, so API workers are not held for the duration
+of a large upload.
+
+Job state is kept in the batch_jobs collection next to the batch headers,
+so any API worker can report progress and serve the result of a job
+another worker accepted, and finished jobs survive a restart. The job
+directory must therefore be shared by the workers (the default temp
+directory is, on one host). Jobs that were queued or running in a worker
+that has since exited are reported as failed.
+
+At most BATCH_JOB_MAX_PENDING jobs are queued or running per worker;
+submit raises ExecutorBusy beyond that. Expired jobs and their files are
+purged every BATCH_JOB_PURGE_INTERVAL_SECONDS.
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from utils.database import get_database, db_call, insert_or_spill, update_or_spill, PREDICTIONS_DB
+from utils.executors import ExecutorBusy
+from utils.settings import int_env
+
+JOB_DIR = os.getenv("BATCH_JOB_DIR", os.path.join(tempfile.gettempdir(), "student_predictor_jobs"))
+JOB_TTL_SECONDS = int_env("BATCH_JOB_TTL_SECONDS", 3600)
+JOBS_COLLECTION = "batch_jobs"
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Identifies this worker process in job documents; the token tells a
+# restarted process apart from its predecessor when the pid is reused
+_HOST = socket.gethostname()
+_WORKER_TOKEN = uuid.uuid4().hex
+
+
+def _worker_alive(job: dict) -> bool:
+    """Whether the worker that accepted a job may still be running it."""
+    if job.get("host") != _HOST:
+        # Another host; its liveness cannot be checked from here
+        return True
+    if job.get("pid") == os.getpid():
+        return job.get("worker_token") == _WORKER_TOKEN
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(job["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, KeyError, TypeError):
+        return True
+    return True
+
+
+class JobProgress:
+    """Handle passed to a running job so it can report progress."""
+
+    def __init__(self, manager, job_id: str):
+        self._manager = manager
+        self.job_id = job_id
+
+    def advance(self, rows: int, errors: int = 0):
+        """Record that another batch of rows has been processed."""
+        self._manager._advance(self.job_id, rows, errors)
+
+    def set_batch_id(self, batch_id):
+        """Remember the stored batch header for this job."""
+        self._manager._update(self.job_id, batch_id=str(batch_id) if batch_id is not None else None)
+
+
+class BatchJobManager:
+    """Runs batch jobs on a bounded thread pool and tracks their progress."""
+
+    def __init__(self, max_workers: int = 2, job_dir: str = JOB_DIR, ttl_seconds: int = JOB_TTL_SECONDS,
+                 max_pending: int = 16, purge_interval: float = 300):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self.job_dir = job_dir
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval = purge_interval
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Jobs accepted by this worker; the collection holds every worker's jobs
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._purger = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch-job")
+            return self._executor
+
+    def _collection(self):
+        db = get_database(PREDICTIONS_DB)
+        return db[JOBS_COLLECTION] if db is not None else None
+
+    def start(self):
+        """Start the thread that purges expired jobs."""
+        with self._lock:
+            if self.purge_interval > 0 and (self._purger is None or not self._purger.is_alive()):
+                self._stop.clear()
+                self._purger = threading.Thread(target=self._purge_loop, name="batch-job-purge", daemon=True)
+                self._purger.start()
+
+    def save_upload(self, fileobj, suffix: str = ".csv"):
+        """
+        Copy an upload to the job directory in chunks.
+
+        Returns (job_id, path, estimated_rows); the row estimate counts line
+        breaks and excludes the header.
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.job_dir, f"{job_id}{suffix}")
+        lines = 0
+        last_byte = b"\n"
+        with open(path, "wb") as out:
+            while True:
+                chunk = fileobj.read(1024 * 1024)
+                if not chunk:
+                    break
+                out.write(chunk)
+                lines += chunk.count(b"\n")
+                last_byte = chunk[-1:]
+        if last_byte != b"\n":
+            lines += 1
+        return job_id, path, max(0, lines - 1)
+
+    def has_capacity(self) -> bool:
+        return self._pending < self.max_pending
+
+    def submit(self, job_id: str, fn: Callable, owner: str, filename: str, rows_total: int,
+               input_path: str) -> dict:
+        """
+        Queue fn(progress, input_path, result_path) on the worker pool.
+
+        The result path is chosen here and served once the job completes.
+        Raises ExecutorBusy when max_pending jobs are already queued or running.
+        """
+        result_path = os.path.join(self.job_dir, f"{job_id}.result")
+        job = {
+            "job_id": job_id,
+            "owner": owner,
+            "filename": filename,
+            "status": "queued",
+            "rows_total": rows_total,
+            "rows_done": 0,
+            "errors": 0,
+            "batch_id": None,
+            "error": None,
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None,
+            "input_path": input_path,
+            "result_path": result_path,
+            "host": _HOST,
+            "pid": os.getpid(),
+            "worker_token": _WORKER_TOKEN,
+        }
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ExecutorBusy(f"Batch job queue is full ({self._pending} jobs pending)")
+            self._pending += 1
+            self._jobs[job_id] = job
+        try:
+            document = {k: v for k, v in job.items() if k != "job_id"}
+            document["_id"] = job_id
+            insert_or_spill(PREDICTIONS_DB, JOBS_COLLECTION, [document])
+        except Exception as e:
+            # The job still runs; only workers other than this one cannot see it
+            print(f"Batch job state error: {e}")
+        try:
+            self._get_executor().submit(self._run, job_id, fn)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                del self._jobs[job_id]
+            raise
+        return self.describe(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        try:
+            collection = self._collection()
+            document = db_call(collection.find_one, {"_id": job_id}) if collection is not None else None
+        except Exception as e:
+            print(f"Batch job state error: {e}")
+            return None
+        if document is None:
+            return None
+        job = dict(document, job_id=document.pop("_id"))
+        if job["status"] in ACTIVE_STATUSES and not _worker_alive(job):
+            job.update(status="failed", error="Interrupted: the worker processing this job stopped",
+                       finished_at=job["finished_at"] or datetime.utcnow())
+            self._store(job_id, {"status": job["status"], "error": job["error"],
+                                 "finished_at": job["finished_at"]}, durable=True)
+        return job
+
+    def describe(self, job_id: str) -> Optional[dict]:
+        """Public view of a job, including percentage and ETA."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        eta = None
+        percent = None
+        if job["rows_total"]:
+            percent = round(min(100.0, 100.0 * job["rows_done"] / job["rows_total"]), 1)
+        if job["status"] == "running" and job["rows_done"] and job["started_at"]:
+            elapsed = (datetime.utcnow() - job["started_at"]).total_seconds()
+            remaining = max(0, job["rows_total"] - job["rows_done"])
+            eta = round(elapsed / job["rows_done"] * remaining, 1)
+        elif job["status"] == "completed":
+            eta = 0.0
+            percent = 100.0
+        return {
+            "job_id": job["job_id"],
+            "filename": job["filename"],
+            "status": job["status"],
+            "rows_total": job["rows_total"],
+            "rows_done": job["rows_done"],
+            "errors": job["errors"],
+            "percent": percent,
+            "eta_seconds": eta,
+            "batch_id": job["batch_id"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+
+    def purge_expired(self):
+        """Forget finished jobs older than the TTL and delete their files."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job["finished_at"] is not None and job["finished_at"] < cutoff
+            ]
+            for job in expired:
+                del self._jobs[job["job_id"]]
+        try:
+            collection = self._collection()
+            if collection is not None:
+                query = {"finished_at": {"$lt": cutoff}}
+                expired += db_call(lambda: list(collection.find(query, {"input_path": 1, "result_path": 1})))
+                db_call(collection.delete_many, query)
+        except Exception as e:
+            print(f"Batch job purge error: {e}")
+        for job in expired:
+            for path in (job.get("input_path"), job.get("result_path")):
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+    def _purge_loop(self):
+        while not self._stop.wait(self.purge_interval):
+            try:
+                self.purge_expired()
+            except Exception as e:
+                print(f"Batch job purge error: {e}")
+
+    def stats(self) -> dict:
+        return {"pending": self._pending, "max_pending": self.max_pending, "max_workers": self.max_workers}
+
+    def shutdown(self, wait: bool = False):
+        self._stop.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _store(self, job_id: str, fields: dict, durable: bool = False):
+        """
+        Mirror job fields to the collection. Progress updates are best
+        effort; durable ones (final status) are spilled while the database
+        is unreachable.
+        """
+        try:
+            if durable:
+                update_or_spill(PREDICTIONS_DB, JOBS_COLLECTION, {"_id": job_id}, {"$set": fields})
+                return
+            collection = self._collection()
+            if collection is not None:
+                db_call(collection.update_one, {"_id": job_id}, {"$set": fields})
+        except Exception as e:
+            print(f"Batch job state error: {e}")
+
+    def _update(self, job_id: str, durable: bool = False, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+        self._store(job_id, fields, durable)
+
+    def _advance(self, job_id: str, rows: int, errors: int):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["rows_done"] += rows
+            job["errors"] += errors
+            # Line counting can underestimate rows with quoted newlines
+            job["rows_total"] = max(job["rows_total"], job["rows_done"])
+            fields = {"rows_done": job["rows_done"], "errors": job["errors"], "rows_total": job["rows_total"]}
+        self._store(job_id, fields)
+
+    def _run(self, job_id: str, fn: Callable):
+        job = self.get(job_id)
+        self._update(job_id, status="running", started_at=datetime.utcnow())
+        tmp_result = job["result_path"] + ".part"
+        try:
+            fn(JobProgress(self, job_id), job["input_path"], tmp_result)
+            shutil.move(tmp_result, job["result_path"])
+            self._update(job_id, durable=True, status="completed", finished_at=datetime.utcnow())
+        except Exception as e:
+            print(f"Batch job {job_id} failed: {e}")
+            self._update(job_id, durable=True, status="failed", error=str(e), finished_at=datetime.utcnow())
+            if os.path.exists(tmp_result):
+                os.remove(tmp_result)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            if os.path.exists(job["input_path"]):
+                os.remove(job["input_path"])
+
+
+batch_jobs = BatchJobManager(
+    max_workers=int_env("BATCH_JOB_WORKERS", 2),
+    max_pending=int_env("BATCH_JOB_MAX_PENDING", 16),
+    purge_interval=int_env("BATCH_JOB_PURGE_INTERVAL_SECONDS", 300),
+)
@@ -0,0 +1,70 @@
+"""
+Storage for CSV batch predictions.
+
+Each upload gets a small header document in batch_predictions (teacher,
+filename, status, totals) and every scored row is stored as its own
+document in batch_results, carrying the header's batch_id and its row
+index in the file. No document grows with the upload, and one student's
+result can be read without loading the rest of the batch.
+
+Rows are written with ordered insert_many calls of BATCH_RESULT_INSERT_SIZE
+documents, so a failure leaves a contiguous prefix of the batch stored.
+While the database is unreachable, headers and rows go to the spill file
+and are written when it comes back; ids are assigned here so spilled rows
+still point at their header.
+"""
+
+from datetime import datetime
+
+from bson import ObjectId
+
+from utils.database import PREDICTIONS_DB, insert_or_spill, update_or_spill
+from utils.settings import int_env
+
+HEADERS_COLLECTION = "batch_predictions"
+RESULTS_COLLECTION = "batch_results"
+
+BATCH_RESULT_INSERT_SIZE = int_env("BATCH_RESULT_INSERT_SIZE", 1000)
+
+
+def create_batch(email: str, filename: str):
+    """Insert the header of a new batch and return its id."""
+    batch_id = ObjectId()
+    insert_or_spill(PREDICTIONS_DB, HEADERS_COLLECTION, [{
+        "_id": batch_id,
+        "teacher_email": email,
+        "filename": filename,
+        "status": "processing",
+        "processed_at": datetime.utcnow()
+    }])
+    return batch_id
+
+
+def store_results(batch_id, email: str, first_row: int, results: list) -> bool:
+    """
+    Insert one document per result, numbered from first_row.
+
+    The result dicts are copied, so callers can still return them to the
+    client without the _id pymongo adds. Returns False when any rows were
+    spilled rather than written; other insert errors propagate.
+    """
+    written = True
+    for start in range(0, len(results), BATCH_RESULT_INSERT_SIZE):
+        documents = []
+        for offset, result in enumerate(results[start:start + BATCH_RESULT_INSERT_SIZE]):
+            document = dict(result)
+            document["batch_id"] = batch_id
+            document["teacher_email"] = email
+            document["row_index"] = first_row + start + offset
+            documents.append(document)
+        written = insert_or_spill(PREDICTIONS_DB, RESULTS_COLLECTION, documents) and written
+    return written
+
+
+def finish_batch(batch_id, status: str, total_students: int, failed_rows: int):
+    """Record the final status and totals on the batch header."""
+    update_or_spill(PREDICTIONS_DB, HEADERS_COLLECTION, {"_id": batch_id}, {"$set": {
+        "status": status,
+        "total_students": total_students,
+        "failed_rows": failed_rows
+    }})
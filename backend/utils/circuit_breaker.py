@@ -0,0 +1,141 @@
+"""
+Circuit breaker for calls to an external dependency.
+
+After failure_threshold consecutive connection failures the breaker opens
+and calls fail immediately with CircuitOpen instead of waiting out driver
+timeouts. Once reset_timeout seconds have passed, one trial call is let
+through (half-open): success closes the breaker, failure opens it again.
+
+Listeners registered with on_close run when the breaker closes after
+having been open, e.g. to replay work that was deferred during the outage.
+"""
+
+import threading
+import time
+from typing import Callable, Tuple, Type
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling the dependency while the breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial call."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float,
+                 failure_exceptions: Tuple[Type[BaseException], ...] = (Exception,)):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._last_error = None
+        self._listeners = []
+        self._stats = {"calls": 0, "failures": 0, "short_circuited": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def on_close(self, listener: Callable[[], None]):
+        """Call listener (on the thread that closed the breaker) after recovery."""
+        self._listeners.append(listener)
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go ahead now.
+
+        While half-open only one caller gets True until that trial reports
+        its outcome; everyone else is short-circuited.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            self._stats["short_circuited"] += 1
+            return False
+
+    def retry_after(self) -> int:
+        """Whole seconds until a trial call is let through; 0 when closed."""
+        with self._lock:
+            if self._state == CLOSED:
+                return 0
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def record_success(self):
+        with self._lock:
+            recovered = self._state != CLOSED
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+        if recovered:
+            print(f"Circuit '{self.name}' closed")
+            for listener in self._listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    print(f"Circuit '{self.name}' listener error: {e}")
+
+    def record_failure(self, error: BaseException):
+        with self._lock:
+            self._failures += 1
+            self._stats["failures"] += 1
+            self._last_error = str(error)
+            self._trial_running = False
+            if self._state != CLOSED or self._failures >= self.failure_threshold:
+                if self._state == CLOSED:
+                    print(f"Circuit '{self.name}' opened after {self._failures} failures: {error}")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._stats["opened"] += 1
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """
+        Run fn through the breaker.
+
+        Raises CircuitOpen without calling fn while open. Exceptions in
+        failure_exceptions count as failures; any other outcome means the
+        dependency answered and counts as a success.
+        """
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+        self._stats["calls"] += 1
+        try:
+            result = fn(*args, **kwargs)
+        except self.failure_exceptions as e:
+            self.record_failure(e)
+            raise
+        except Exception:
+            self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self._current_state()
+            stats["consecutive_failures"] = self._failures
+            stats["last_error"] = self._last_error
+            stats["open_for_seconds"] = (
+                round(time.monotonic() - self._opened_at, 1) if self._state == OPEN else 0.0
+            )
+        return stats
@@ -0,0 +1,218 @@
+"""
+Shared MongoDB connection pool.
+
+One MongoClient per process; it is thread-safe and pools connections
+internally, so routers borrow databases from it instead of constructing
+their own clients per request.
+
+Database calls on the request paths go through db_call, which runs them
+behind a circuit breaker: after MONGO_BREAKER_FAILURES consecutive
+connection failures, calls fail at once with CircuitOpen (and
+get_database returns None) for MONGO_BREAKER_RESET_SECONDS instead of
+each waiting out the driver timeouts. Writes refused or failed that way
+go to the spill file and are replayed when the breaker closes.
+
+Routes answer an unavailable database with unavailable_error: 503 with a
+Retry-After header, so clients can tell an outage from a server bug.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import ConnectionFailure
+
+from utils.circuit_breaker import CircuitBreaker, CircuitOpen, OPEN
+from utils.settings import int_env, float_env
+from utils.spill import SpillFile
+
+PREDICTIONS_DB = "student_performance"
+TEACHERS_DB = "student_predictor"
+
+_client: Optional[MongoClient] = None
+_lock = threading.Lock()
+_health = {"ok": None, "checked_at": 0.0, "error": None}
+
+# Errors that mean the database could not be reached; they trip the breaker
+# and writes that hit them are spilled
+UNAVAILABLE_ERRORS = (CircuitOpen, ConnectionFailure)
+
+db_breaker = CircuitBreaker(
+    "mongodb",
+    failure_threshold=int_env("MONGO_BREAKER_FAILURES", 3),
+    reset_timeout=float_env("MONGO_BREAKER_RESET_SECONDS", 30),
+    failure_exceptions=(ConnectionFailure,),
+)
+
+spill_file = SpillFile(os.getenv("MONGO_SPILL_FILE", os.path.join("spill", "mongo_spill.jsonl")))
+
+# (database, collection, keys, options) created at startup; create_index is a
+# no-op when an identical index already exists
+INDEXES = [
+    # History by student and by date; _id breaks ties for cursor pagination
+    (PREDICTIONS_DB, "predictions",
+     [("roll_number", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    (PREDICTIONS_DB, "predictions", [("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    # A teacher's uploads, newest first
+    (PREDICTIONS_DB, "batch_predictions",
+     [("teacher_email", ASCENDING), ("processed_at", DESCENDING), ("_id", DESCENDING)], {}),
+    # Per-student batch results: a batch in file order, and one student's results
+    (PREDICTIONS_DB, "batch_results",
+     [("batch_id", ASCENDING), ("row_index", ASCENDING)], {"unique": True}),
+    (PREDICTIONS_DB, "batch_results",
+     [("teacher_email", ASCENDING), ("roll_number", ASCENDING), ("_id", DESCENDING)], {}),
+    # Background upload jobs, purged once finished_at is past the TTL
+    (PREDICTIONS_DB, "batch_jobs", [("finished_at", ASCENDING)], {}),
+    # Labeled records not yet added to the training dataset
+    (PREDICTIONS_DB, "labeled_records", [("ingested_at", ASCENDING)], {}),
+    # Uniqueness declared in database/schema.json
+    (PREDICTIONS_DB, "students", [("roll_number", ASCENDING)], {"unique": True}),
+    (TEACHERS_DB, "teachers", [("email", ASCENDING)], {"unique": True}),
+    # Token revocations: unexpired ones are reloaded by each worker, removed after the token's exp
+    (TEACHERS_DB, "revoked_tokens", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+]
+
+
+def client_options() -> dict:
+    """Pool size and timeouts, configurable through the environment."""
+    return {
+        "maxPoolSize": int_env("MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": int_env("MONGO_MIN_POOL_SIZE", 0),
+        "serverSelectionTimeoutMS": int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": int_env("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": int_env("MONGO_SOCKET_TIMEOUT_MS", 10000),
+        "waitQueueTimeoutMS": int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000),
+    }
+
+
+def get_client() -> MongoClient:
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    client = _client
+    if client is not None:
+        return client
+
+    with _lock:
+        if _client is None:
+            mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+            _client = MongoClient(mongo_uri, **client_options())
+        return _client
+
+
+def get_database(name: str = PREDICTIONS_DB):
+    """
+    Get a database handle backed by the shared pool.
+
+    Returns None if the client cannot be created or the circuit breaker is
+    open, so callers fail fast instead of waiting on an unreachable server.
+    """
+    if db_breaker.state == OPEN:
+        return None
+    try:
+        return get_client()[name]
+    except Exception as e:
+        print(f"MongoDB connection error: {e}")
+        return None
+
+
+def unavailable_error(detail: str = "Database unavailable") -> HTTPException:
+    """503 for an unreachable database, with Retry-After set to the breaker's reset."""
+    retry_after = db_breaker.retry_after() or int(db_breaker.reset_timeout)
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(max(1, retry_after))})
+
+
+def db_call(fn, *args, **kwargs):
+    """Run a database call behind the circuit breaker; raises CircuitOpen while it is open."""
+    return db_breaker.call(fn, *args, **kwargs)
+
+
+def insert_or_spill(db_name: str, collection: str, documents: list) -> bool:
+    """
+    insert_many(documents), or append them to the spill file when the
+    database is unreachable. Returns False when the documents were spilled.
+    """
+    try:
+        db_call(lambda: get_client()[db_name][collection].insert_many(documents, ordered=True))
+        return True
+    except UNAVAILABLE_ERRORS:
+        spill_file.spill_insert(db_name, collection, documents)
+        return False
+
+
+def update_or_spill(db_name: str, collection: str, query: dict, update: dict) -> bool:
+    """update_one(query, update), spilled like insert_or_spill when the database is unreachable."""
+    try:
+        db_call(lambda: get_client()[db_name][collection].update_one(query, update))
+        return True
+    except UNAVAILABLE_ERRORS:
+        spill_file.spill_update(db_name, collection, query, update)
+        return False
+
+
+def replay_spill() -> int:
+    """Write spilled operations to the database; returns how many were applied."""
+    return spill_file.replay(get_client, db_call, UNAVAILABLE_ERRORS)
+
+
+def _replay_in_background():
+    if spill_file.has_pending():
+        threading.Thread(target=replay_spill, name="spill-replay", daemon=True).start()
+
+
+db_breaker.on_close(_replay_in_background)
+
+
+def close_client():
+    """Close the pool; called on application shutdown."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def ensure_indexes() -> dict:
+    """
+    Create the indexes in INDEXES, returning {name: "ok" | error}.
+
+    Failures (for example existing duplicates under a unique index) are
+    reported and skipped so one bad index does not block the others.
+    """
+    results = {}
+    for db_name, collection, keys, options in INDEXES:
+        label = f"{db_name}.{collection}." + "_".join(f"{field}_{direction}" for field, direction in keys)
+        try:
+            get_client()[db_name][collection].create_index(keys, **options)
+            results[label] = "ok"
+        except Exception as e:
+            print(f"MongoDB index error ({label}): {e}")
+            results[label] = str(e)
+    return results
+
+
+def database_health(max_age_seconds: float = 10.0) -> dict:
+    """
+    Report database reachability.
+
+    The ping result is cached for max_age_seconds so frequent health checks
+    do not add a round trip each time.
+    """
+    now = time.monotonic()
+    if _health["ok"] is None or now - _health["checked_at"] > max_age_seconds:
+        try:
+            # Through the breaker, so a health check can be the half-open trial
+            db_call(lambda: get_client().admin.command("ping"))
+            _health.update({"ok": True, "error": None})
+        except Exception as e:
+            _health.update({"ok": False, "error": str(e)})
+        _health["checked_at"] = now
+    return {
+        "database_ok": _health["ok"],
+        "error": _health["error"],
+        "checked_seconds_ago": round(time.monotonic() - _health["checked_at"], 1),
+        "circuit": db_breaker.state,
+        "spilled_pending": spill_file.pending,
+    }
@@ -0,0 +1,250 @@
+"""
+Columnar store for labeled training records.
+
+A dataset is a directory of chunks, each holding one uncompressed .npy
+file per column, plus a manifest.json with the column dtypes and the row
+count of every chunk:
+
+    training_data/
+        manifest.json
+        chunk_000000/attendance.npy, ..., performance.npy
+        chunk_000001/...
+
+Columns are opened memory-mapped, so reading a few columns of millions of
+rows costs only the pages that are touched, and appending new records
+writes one new chunk without rewriting the existing ones. Chunks and the
+manifest are written to temporary paths and renamed into place, so a
+reader never sees a half-written append.
+
+Convert the JSON dump written by older versions of model/train_model.py:
+    python -m utils.dataset_store convert ../database/training_data_3000.json ../database/training_data
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from utils.features import FEATURE_NAMES
+
+MANIFEST_FILE = "manifest.json"
+
+LABEL_COLUMN = "performance"
+
+# Columns of the training dataset; string columns use fixed-width unicode
+# so they can be memory-mapped like the numeric ones
+TRAINING_SCHEMA = {name: "float64" for name in FEATURE_NAMES}
+TRAINING_SCHEMA["final_score"] = "float64"
+TRAINING_SCHEMA[LABEL_COLUMN] = "<U16"
+
+
+def performance_category(final_score: float) -> str:
+    """Label for a final score, using the thresholds the dataset was generated with."""
+    if final_score < 50:
+        return 'Poor'
+    elif final_score < 65:
+        return 'Average'
+    elif final_score < 80:
+        return 'Good'
+    else:
+        return 'Excellent'
+
+
+DEFAULT_DATASET_DIR = os.getenv(
+    "TRAINING_DATASET_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "database", "training_data"),
+)
+
+# Rows per chunk written by convert_json
+CONVERT_CHUNK_ROWS = 100000
+
+
+class DatasetStore:
+    """Append-only chunked column store; one writer, any number of readers."""
+
+    def __init__(self, path: str, schema: Optional[Dict[str, str]] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self._manifest = json.load(f)
+            if schema is not None and schema != self._manifest["columns"]:
+                raise ValueError(f"Dataset at {path} has columns {self._manifest['columns']}, not {schema}")
+        else:
+            self._manifest = {"columns": dict(schema) if schema else None, "chunks": []}
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._manifest["columns"] or {})
+
+    @property
+    def n_rows(self) -> int:
+        return sum(chunk["rows"] for chunk in self._manifest["chunks"])
+
+    @property
+    def n_chunks(self) -> int:
+        return len(self._manifest["chunks"])
+
+    def append(self, columns: Dict[str, Sequence]) -> int:
+        """
+        Write one chunk from equal-length column arrays; returns its row count.
+
+        The first append of a store created without a schema fixes the
+        columns and dtypes; later appends must supply the same columns and
+        are cast to those dtypes.
+        """
+        arrays = {name: np.asarray(values) for name, values in columns.items()}
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        n_rows = lengths.pop()
+        if n_rows == 0:
+            return 0
+
+        with self._lock:
+            schema = self._manifest["columns"]
+            if schema is None:
+                schema = {name: array.dtype.str for name, array in arrays.items()}
+            if set(arrays) != set(schema):
+                raise ValueError(f"Expected columns {sorted(schema)}, got {sorted(arrays)}")
+
+            chunk_name = self._next_chunk_name()
+            chunk_path = os.path.join(self.path, chunk_name)
+            tmp_path = chunk_path + ".tmp"
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+            os.makedirs(tmp_path)
+            for name, dtype in schema.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"),
+                        np.ascontiguousarray(arrays[name], dtype=np.dtype(dtype)))
+            if os.path.exists(chunk_path):
+                # Left over from an append whose manifest update never happened
+                shutil.rmtree(chunk_path)
+            os.replace(tmp_path, chunk_path)
+
+            manifest = {
+                "columns": schema,
+                "chunks": self._manifest["chunks"] + [{"name": chunk_name, "rows": n_rows}],
+            }
+            self._write_manifest(manifest)
+            self._manifest = manifest
+        return n_rows
+
+    def _next_chunk_name(self) -> str:
+        numbers = [int(chunk["name"].split("_")[1]) for chunk in self._manifest["chunks"]]
+        return f"chunk_{max(numbers, default=-1) + 1:06d}"
+
+    def append_records(self, records: List[dict]) -> int:
+        """Append a list of row dicts (e.g. labeled records from MongoDB)."""
+        if not records:
+            return 0
+        names = self.columns or list(records[0])
+        return self.append({name: [record[name] for record in records] for name in names})
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = os.path.join(self.path, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILE))
+
+    def _load_chunk_column(self, chunk: dict, name: str, mmap: bool) -> np.ndarray:
+        return np.load(os.path.join(self.path, chunk["name"], f"{name}.npy"),
+                       mmap_mode="r" if mmap else None, allow_pickle=False)
+
+    def iter_chunks(self, columns: Optional[Sequence[str]] = None, mmap: bool = True) -> Iterator[Dict[str, np.ndarray]]:
+        """Yield {column: array} per chunk, for passes over data larger than memory."""
+        names = list(columns or self.columns)
+        for chunk in self._manifest["chunks"]:
+            yield {name: self._load_chunk_column(chunk, name, mmap) for name in names}
+
+    def read(self, columns: Optional[Sequence[str]] = None, mmap: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Whole columns as arrays.
+
+        With a single chunk the arrays are read-only memory maps of the
+        files; otherwise the chunks are concatenated into memory.
+        """
+        names = list(columns or self.columns)
+        chunks = self._manifest["chunks"]
+        if len(chunks) == 1:
+            return {name: self._load_chunk_column(chunks[0], name, mmap) for name in names}
+        return {
+            name: np.concatenate([self._load_chunk_column(chunk, name, mmap) for chunk in chunks])
+            if chunks else np.empty(0, dtype=np.dtype(self._manifest["columns"][name]))
+            for name in names
+        }
+
+    def read_matrix(self, columns: Sequence[str], dtype=np.float64) -> np.ndarray:
+        """(rows x columns) matrix filled chunk by chunk, e.g. the training features."""
+        out = np.empty((self.n_rows, len(columns)), dtype=dtype)
+        start = 0
+        for chunk in self.iter_chunks(columns):
+            rows = len(chunk[columns[0]])
+            for j, name in enumerate(columns):
+                out[start:start + rows, j] = chunk[name]
+            start += rows
+        return out
+
+    def compact(self):
+        """Rewrite all chunks as a single chunk so reads map files directly."""
+        if self.n_chunks <= 1:
+            return
+        data = self.read(mmap=False)
+        schema = self._manifest["columns"]
+        old_chunks = [chunk["name"] for chunk in self._manifest["chunks"]]
+        shutil.rmtree(self.path + ".compact", ignore_errors=True)
+        compacted = DatasetStore(self.path + ".compact", schema)
+        compacted.append(data)
+        with self._lock:
+            # Move the compacted chunk in under a fresh name, then switch the manifest
+            chunk_name = self._next_chunk_name()
+            os.replace(os.path.join(compacted.path, "chunk_000000"), os.path.join(self.path, chunk_name))
+            manifest = {"columns": schema, "chunks": [{"name": chunk_name, "rows": compacted.n_rows}]}
+            self._write_manifest(manifest)
+            self._manifest = manifest
+        shutil.rmtree(compacted.path)
+        for name in old_chunks:
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def describe(self) -> dict:
+        return {
+            "path": os.path.abspath(self.path),
+            "rows": self.n_rows,
+            "chunks": self.n_chunks,
+            "columns": self._manifest["columns"],
+        }
+
+
+def open_training_dataset(path: str = DEFAULT_DATASET_DIR) -> DatasetStore:
+    return DatasetStore(path, TRAINING_SCHEMA)
+
+
+def convert_json(json_path: str, store_path: str, schema: Optional[Dict[str, str]] = TRAINING_SCHEMA,
+                 chunk_rows: int = CONVERT_CHUNK_ROWS) -> DatasetStore:
+    """Append the records of a JSON array file to a dataset store."""
+    with open(json_path) as f:
+        records = json.load(f)
+    store = DatasetStore(store_path, schema)
+    for start in range(0, len(records), chunk_rows):
+        store.append_records(records[start:start + chunk_rows])
+    return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "convert":
+        converted = convert_json(sys.argv[2], sys.argv[3])
+        print(f"✓ Converted {sys.argv[2]} -> {sys.argv[3]}")
+        print(json.dumps(converted.describe(), indent=2))
+    elif len(sys.argv) == 3 and sys.argv[1] == "info":
+        print(json.dumps(DatasetStore(sys.argv[2]).describe(), indent=2))
+    else:
+        print("Usage: python -m utils.dataset_store convert <records.json> <dataset_dir>")
+        print("       python -m utils.dataset_store info <dataset_dir>")
+        sys.exit(1)
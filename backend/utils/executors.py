@@ -0,0 +1,104 @@
+"""
+Bounded executors for CPU-bound work called from async endpoints.
+
+Async routes must not run inference or CSV parsing on the event loop, so
+they hand it to one of these pools and await the result. Each pool has a
+fixed number of worker threads and a cap on queued plus running tasks;
+past the cap, submit raises ExecutorBusy so the route can answer 503
+instead of queueing without bound.
+
+Separate pools keep large CSV uploads from occupying the workers that
+single predictions use.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from utils.settings import int_env
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when an executor already has its maximum number of pending tasks."""
+
+
+class BoundedExecutor:
+    """Thread pool with a limit on queued plus running tasks."""
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"submitted": 0, "rejected": 0, "high_water": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule fn(*args, **kwargs); raises ExecutorBusy when the pool is saturated."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise ExecutorBusy(f"{self.name} executor is busy ({self._pending} tasks pending)")
+            self._pending += 1
+            self._stats["submitted"] += 1
+            self._stats["high_water"] = max(self._stats["high_water"], self._pending)
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run fn on the pool and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["pending"] = self._pending
+        stats["max_workers"] = self.max_workers
+        stats["max_pending"] = self.max_pending
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Single predictions: model loading and unbatched inference
+inference_executor = BoundedExecutor(
+    "inference",
+    max_workers=int_env("INFERENCE_WORKERS", os.cpu_count() or 2),
+    max_pending=int_env("INFERENCE_MAX_PENDING", 1000),
+)
+
+# bcrypt hashing and verification for teacher register/login; a small pool
+# with a short queue so a login storm is shed instead of starving predictions
+password_executor = BoundedExecutor(
+    "password-hash",
+    max_workers=int_env("PASSWORD_HASH_WORKERS", 2),
+    max_pending=int_env("PASSWORD_HASH_MAX_PENDING", 16),
+)
+
+# Whole-file scoring for POST /teacher/upload/csv
+upload_executor = BoundedExecutor(
+    "csv-upload",
+    max_workers=int_env("CSV_UPLOAD_WORKERS", 2),
+    max_pending=int_env("CSV_UPLOAD_MAX_PENDING", 8),
+)
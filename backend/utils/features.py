@@ -0,0 +1,75 @@
+"""
+Feature assembly shared by the single and batch prediction paths.
+
+Rows are written straight into float64 arrays in the exact column order
+used during training, and standardized with the scaler's fitted mean_ and
+scale_ in place, so no DataFrame is built per request.
+"""
+
+import threading
+
+import numpy as np
+
+# CRITICAL: Order must match exactly the feature order used during training
+FEATURE_NAMES = ['attendance', 'assignment_score', 'internal_marks', 'prev_cgpa', 'study_hours', 'sleep_hours']
+N_FEATURES = len(FEATURE_NAMES)
+
+_ATTENDANCE = FEATURE_NAMES.index('attendance')
+_ASSIGNMENT_SCORE = FEATURE_NAMES.index('assignment_score')
+_INTERNAL_MARKS = FEATURE_NAMES.index('internal_marks')
+_PREV_CGPA = FEATURE_NAMES.index('prev_cgpa')
+_STUDY_HOURS = FEATURE_NAMES.index('study_hours')
+_SLEEP_HOURS = FEATURE_NAMES.index('sleep_hours')
+
+_local = threading.local()
+
+
+def internal_marks(assignment_score: float) -> float:
+    """Internal marks approximation from the assignment percentage."""
+    return min(50, assignment_score * 0.5)
+
+
+def assemble_features(attendance, assignment_score, prev_cgpa, study_hours, sleep_hours,
+                      out=None) -> np.ndarray:
+    """
+    Write one feature row in training order.
+
+    out may be a row of a preallocated matrix; a new row is allocated
+    when it is omitted.
+    """
+    if out is None:
+        out = np.empty(N_FEATURES, dtype=np.float64)
+    out[_ATTENDANCE] = attendance
+    out[_ASSIGNMENT_SCORE] = assignment_score
+    out[_INTERNAL_MARKS] = internal_marks(assignment_score)
+    out[_PREV_CGPA] = prev_cgpa
+    out[_STUDY_HOURS] = study_hours
+    out[_SLEEP_HOURS] = sleep_hours
+    return out
+
+
+def _scratch(n_rows: int) -> np.ndarray:
+    """Per-thread (n_rows x N_FEATURES) work matrix, grown as needed."""
+    buffer = getattr(_local, "scratch", None)
+    if buffer is None or buffer.shape[0] < n_rows:
+        buffer = _local.scratch = np.empty((max(n_rows, 64), N_FEATURES), dtype=np.float64)
+    return buffer[:n_rows]
+
+
+def standardize(features: np.ndarray, scaler) -> np.ndarray:
+    """
+    Apply a fitted StandardScaler as a fused (x - mean_) / scale_.
+
+    The result lives in a per-thread scratch matrix that the next call on
+    the same thread overwrites. Scalers without mean_/scale_ fall back to
+    their own transform.
+    """
+    mean = getattr(scaler, "mean_", None)
+    scale = getattr(scaler, "scale_", None)
+    if mean is None or scale is None:
+        return scaler.transform(features)
+    out = _scratch(features.shape[0])
+    # Same operations in the same order as StandardScaler.transform
+    np.subtract(features, mean, out=out)
+    np.divide(out, scale, out=out)
+    return out
@@ -0,0 +1,64 @@
+"""
+Advisory file locks shared by the API worker processes.
+
+Threading locks only cover one process; with several uvicorn workers,
+state on disk (the spill file, the training dataset) is guarded by an
+flock on a lock file next to it. The OS releases the lock when the
+holding process exits, so a crash never leaves it stuck.
+
+On platforms without fcntl (Windows) the lock only covers this process.
+"""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive lock on a file, usable across threads and processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; with blocking=False returns False if it is held elsewhere."""
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(fd)
+                    self._thread_lock.release()
+                    return False
+            self._fd = fd
+            return True
+        except Exception:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
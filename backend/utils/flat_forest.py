@@ -0,0 +1,277 @@
+"""
+Flat array representation of a trained RandomForestClassifier.
+
+All trees are concatenated into a handful of NumPy arrays (split feature,
+threshold, children and normalized leaf probabilities) and evaluated for
+every tree and row at once. The arithmetic mirrors sklearn exactly, so
+predict_proba matches RandomForestClassifier.predict_proba bit for bit.
+
+The arrays are stored as uncompressed .npy files in a forest/ directory
+and opened memory-mapped, so every worker process on a host shares the
+same pages through the OS cache instead of holding a private copy.
+
+Small inputs are much faster than sklearn (one row: ~0.3 ms against ~20
+ms), and the gap closes around 1000 rows; on large matrices the walk costs
+about 2x sklearn per row. Rows are evaluated ROW_CHUNK at a time, so memory
+stays bounded, and matrices of PARALLEL_SCORING_MIN_ROWS rows or more are
+split across the scoring pool (utils.scoring_pool) when it is enabled.
+
+meta.json records the digest of the model.pkl the forest was compiled
+from (utils.artifact_digest); the registry ignores a forest whose digest
+no longer matches.
+
+Compile an existing model (and export its scaler and encoder arrays) with:
+    python -m utils.flat_forest model
+"""
+
+import copy
+import json
+import os
+import shutil
+import sys
+from typing import Optional
+
+import numpy as np
+
+from utils.artifact_digest import FOREST_SOURCES, sources_digest
+
+FOREST_DIR = "forest"
+
+_ARRAY_NAMES = ("feature", "threshold", "children", "leaf_proba", "roots", "classes")
+
+# Rows evaluated per pass; bounds the (trees x rows) working arrays
+ROW_CHUNK = 1024
+
+# Up to this many rows, leaf probabilities are summed in one vectorized
+# pass; larger inputs add one tree at a time to stay in cache
+SMALL_BATCH_ROWS = 64
+
+
+class FlatForest:
+    """Drop-in replacement for a fitted forest's predict/predict_proba."""
+
+    def __init__(self, feature, threshold, children, leaf_proba, roots, classes, max_depth,
+                 n_features_in):
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * node + went_left] gives the next node in one gather
+        self.children = children
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features_in)
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf index (into the flat arrays) reached by every tree for every row."""
+        # Trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        values = X.ravel()
+        row_offsets = np.arange(X.shape[0]) * X.shape[1]
+        nodes = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        # take() and in-place updates avoid the temporaries of fancy indexing
+        for _ in range(self.max_depth):
+            offsets = self.feature.take(nodes)
+            offsets += row_offsets
+            go_left = values.take(offsets) <= self.threshold.take(nodes)
+            nodes *= 2
+            nodes += go_left
+            nodes = self.children.take(nodes)
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Average leaf probabilities across trees, accumulated in tree order."""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.zeros((X.shape[0], len(self.classes_)), dtype=np.float64)
+        if X.shape[0] <= SMALL_BATCH_ROWS:
+            # cumsum adds tree by tree, the same order sklearn accumulates in
+            out[:] = np.cumsum(self.leaf_proba[self.apply(X)], axis=0)[-1]
+            out /= self.n_estimators
+            return out
+        buffer = np.empty((ROW_CHUNK, len(self.classes_)), dtype=np.float64)
+        for start in range(0, X.shape[0], ROW_CHUNK):
+            leaves = self.apply(X[start:start + ROW_CHUNK])
+            acc = out[start:start + ROW_CHUNK]
+            proba = buffer[:leaves.shape[1]]
+            # Same tree order as above, without the (trees x rows x classes) temporary
+            for tree_leaves in leaves:
+                self.leaf_proba.take(tree_leaves, axis=0, out=proba)
+                acc += proba
+        out /= self.n_estimators
+        return out
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    @property
+    def mapped_nbytes(self) -> int:
+        """Bytes backed by memory-mapped files rather than private memory."""
+        arrays = (self.feature, self.threshold, self.children, self.leaf_proba)
+        return sum(array.nbytes for array in arrays if isinstance(array, np.memmap))
+
+    def save(self, path: str, source_digest: Optional[str] = None):
+        """
+        Write each array as an uncompressed .npy file under path.
+
+        source_digest identifies the model.pkl the forest was compiled from.
+
+        Files go to a temporary directory that is renamed into place, so a
+        reader never sees a partially written forest.
+        """
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        arrays = {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "leaf_proba": self.leaf_proba,
+            "roots": self.roots,
+            "classes": self.classes_,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({
+                "max_depth": self.max_depth,
+                "n_features_in": self.n_features_in_,
+                "n_estimators": self.n_estimators,
+                "source_digest": source_digest,
+            }, f, indent=2)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "FlatForest":
+        """Open a saved forest; arrays are memory-mapped read-only by default."""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in _ARRAY_NAMES
+        }
+        # Tiny arrays are read into memory; indexing them is on the hot path
+        arrays["roots"] = np.array(arrays["roots"])
+        arrays["classes"] = np.array(arrays["classes"])
+        return cls(max_depth=meta["max_depth"], n_features_in=meta["n_features_in"], **arrays)
+
+
+def forest_source_digest(path: str) -> Optional[str]:
+    """Digest of the model.pkl a saved forest was compiled from, if recorded."""
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f).get("source_digest")
+
+
+def _tree_values_are_counts() -> bool:
+    """
+    Whether tree_.value holds weighted counts that predict_proba normalizes.
+
+    scikit-learn 1.4 switched to storing class fractions and returns them
+    unchanged, so normalizing again would change the last bits.
+    """
+    import sklearn
+    major, minor = (int(part) for part in sklearn.__version__.split(".")[:2])
+    return (major, minor) < (1, 4)
+
+
+def compile_forest(model) -> FlatForest:
+    """Flatten a fitted single-output RandomForestClassifier."""
+    if not hasattr(model, "estimators_") or getattr(model, "n_outputs_", 1) != 1:
+        raise TypeError(f"Cannot compile {type(model).__name__}; expected a single-output fitted forest")
+
+    n_classes = len(model.classes_)
+    normalize = _tree_values_are_counts()
+    features, thresholds, children, probas, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        node_ids = np.arange(n_nodes)
+        is_leaf = tree.children_left == -1
+
+        # Leaves point at themselves and always "go left", so extra
+        # iterations past a shallow leaf are harmless
+        feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+        threshold = np.where(is_leaf, np.inf, tree.threshold).astype(np.float64)
+        left = np.where(is_leaf, node_ids, tree.children_left).astype(np.intp) + offset
+        right = np.where(is_leaf, node_ids, tree.children_right).astype(np.intp) + offset
+
+        proba = tree.value[:, 0, :n_classes].astype(np.float64, copy=True)
+        if normalize:
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+
+        features.append(feature)
+        thresholds.append(threshold)
+        children.append(np.stack([right, left], axis=1).ravel())
+        probas.append(proba)
+        roots.append(offset)
+        offset += n_nodes
+        max_depth = max(max_depth, tree.max_depth)
+
+    return FlatForest(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        children=np.concatenate(children),
+        leaf_proba=np.concatenate(probas),
+        roots=np.asarray(roots, dtype=np.intp),
+        classes=np.asarray(model.classes_),
+        max_depth=max_depth,
+        n_features_in=model.n_features_in_,
+    )
+
+
+def verify_forest(flat: FlatForest, model, X) -> bool:
+    """
+    Check that flat and sklearn probabilities are bit-for-bit identical.
+
+    sklearn is run single-threaded because parallel accumulation adds the
+    trees in a nondeterministic order.
+    """
+    reference = copy.copy(model)
+    reference.n_jobs = 1
+    return np.array_equal(flat.predict_proba(X), reference.predict_proba(np.asarray(X)))
+
+
+def export_forest(model, model_dir: str, X_check) -> str:
+    """
+    Compile, verify against sklearn and write forest/ next to model.pkl.
+
+    model.pkl must already be saved in model_dir: its digest is recorded so
+    the forest is only served alongside that exact pickle.
+    """
+    flat = compile_forest(model)
+    if not verify_forest(flat, model, X_check):
+        raise ValueError("Compiled forest does not reproduce sklearn predict_proba")
+    path = os.path.join(model_dir, FOREST_DIR)
+    flat.save(path, source_digest=sources_digest(model_dir, FOREST_SOURCES))
+    return path
+
+
+if __name__ == "__main__":
+    import joblib
+
+    from utils.preprocessing import export_preprocessing
+
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else "model"
+    model = joblib.load(os.path.join(model_dir, "model.pkl"))
+    # Verify on random standardized inputs spanning the scaled feature range
+    rng = np.random.default_rng(42)
+    X_check = rng.normal(0, 1.5, size=(5000, model.n_features_in_))
+    path = export_forest(model, model_dir, X_check)
+    print(f"✓ Compiled {len(model.estimators_)} trees to {path} (verified bit-for-bit)")
+    scaler = joblib.load(os.path.join(model_dir, "scaler.pkl"))
+    le = joblib.load(os.path.join(model_dir, "label_encoder.pkl"))
+    print(f"✓ Exported scaler and label encoder to {export_preprocessing(scaler, le, model_dir)}")
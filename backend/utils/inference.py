@@ -0,0 +1,192 @@
+"""
+Batch inference utilities for student performance prediction.
+"""
+
+import numpy as np
+
+from utils.features import N_FEATURES, assemble_features, standardize
+from utils.metrics import (
+    prediction_cache_hits, prediction_cache_misses, prediction_errors, prediction_rows, stage,
+)
+from utils.prediction_cache import prediction_cache
+from utils.scoring_pool import scoring_pool
+
+# Score weights per encoded class: Average=55, Excellent=90, Good=75, Poor=35
+CATEGORY_SCORES = np.array([55, 90, 75, 35], dtype=float)
+
+
+class RowError(ValueError):
+    """Raised when a single uploaded row cannot be scored."""
+
+
+def parse_csv_row(row):
+    """
+    Parse one uploaded CSV row into model inputs.
+
+    Raises RowError for malformed numbers or missing marks so the caller
+    can report the row without aborting the whole batch.
+    """
+    try:
+        attendance = float(row.get("attendance", 0))
+        prev_cgpa = float(row.get("prev_cgpa", 0))
+        study_hours = float(row.get("study_hours", 0))
+        sleep_hours = float(row.get("sleep_hours", 0))
+
+        # Extract subject marks (all columns with "subject" prefix)
+        subject_marks = [float(v) for k, v in row.items() if k and k.startswith("subject") and v]
+
+        # Extract assignment marks (all columns with "assignment" prefix)
+        assignment_marks = [float(v) for k, v in row.items() if k and k.startswith("assignment") and v]
+    except (TypeError, ValueError) as e:
+        raise RowError(f"Invalid data format: {str(e)}")
+
+    if not subject_marks or not assignment_marks:
+        raise RowError("Missing subject or assignment marks")
+
+    avg_assignment = float(np.mean(assignment_marks))
+    avg_subject = float(np.mean(subject_marks))
+
+    return {
+        "attendance": attendance,
+        "prev_cgpa": prev_cgpa,
+        "study_hours": study_hours,
+        "sleep_hours": sleep_hours,
+        "avg_assignment": avg_assignment,
+        "avg_subject": avg_subject,
+    }
+
+
+def predict_matrix(model, scaler, le, features, pipeline="batch"):
+    """
+    Scale and predict a whole feature matrix in one pass.
+
+    Returns (categories, probabilities, scores) where probabilities has one
+    row per input row. Labels are derived from the argmax of predict_proba,
+    which is exactly what RandomForestClassifier.predict does internally.
+    """
+    features = np.asarray(features, dtype=np.float64).reshape(-1, N_FEATURES)
+    if features.shape[0] == 0:
+        return np.array([], dtype=object), np.empty((0, len(le.classes_))), np.empty(0)
+
+    with stage(pipeline, "scale"):
+        X_scaled = standardize(features, scaler)
+    with stage(pipeline, "infer"):
+        pred_proba = model.predict_proba(X_scaled)
+        pred_labels = model.classes_.take(np.argmax(pred_proba, axis=1))
+        categories = le.inverse_transform(pred_labels)
+        scores = np.clip(pred_proba @ CATEGORY_SCORES, 0, 100)
+    return categories, pred_proba, scores
+
+
+def _score_matrix(bundle, features, pipeline):
+    """predict_matrix for a bundle, spread over the scoring pool when the matrix is large."""
+    if scoring_pool.should_parallelize(features.shape[0]):
+        # Scaling happens inside the workers, so the whole call counts as inference
+        with stage(pipeline, "infer"):
+            return scoring_pool.predict(bundle, features)
+    return predict_matrix(bundle.model, bundle.scaler, bundle.le, features, pipeline)
+
+
+def predict_bundle(bundle, features, cache=prediction_cache, pipeline="batch"):
+    """
+    Like predict_matrix for a model bundle, serving repeated rows from the cache.
+
+    Only cache misses are scaled and scored, still as a single matrix.
+    Matrices larger than the cache's max_batch_rows skip it entirely.
+    """
+    features = np.asarray(features, dtype=np.float64).reshape(-1, N_FEATURES)
+    prediction_rows.inc(features.shape[0], pipeline=pipeline)
+    if cache is None or not cache.accepts(features.shape[0]):
+        return _score_matrix(bundle, features, pipeline)
+
+    n_rows = features.shape[0]
+    categories = np.empty(n_rows, dtype=object)
+    probabilities = np.empty((n_rows, len(bundle.le.classes_)))
+    scores = np.empty(n_rows)
+
+    keys = [cache.key(bundle.version, row) for row in features]
+    misses = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key)
+        if cached is None:
+            misses.append(i)
+        else:
+            categories[i], probabilities[i], scores[i] = cached
+
+    prediction_cache_hits.inc(n_rows - len(misses), pipeline=pipeline)
+    prediction_cache_misses.inc(len(misses), pipeline=pipeline)
+    if misses:
+        miss_categories, miss_probabilities, miss_scores = _score_matrix(
+            bundle, features[misses], pipeline
+        )
+        for j, i in enumerate(misses):
+            categories[i] = miss_categories[j]
+            probabilities[i] = miss_probabilities[j]
+            scores[i] = miss_scores[j]
+            cache.put(keys[i], (miss_categories[j], miss_probabilities[j].copy(), miss_scores[j]))
+
+    return categories, probabilities, scores
+
+
+def score_rows(rows, bundle):
+    """
+    Parse and score a list of raw CSV rows as one matrix.
+
+    Returns one result dict per input row, in input order. Rows that cannot
+    be parsed get an "error" entry instead of a prediction.
+    """
+    results = []
+    parsed_rows = []
+    with stage("batch", "parse"):
+        for row in rows:
+            student_name = row.get("student_name", "Unknown")
+            roll_number = row.get("roll_number", "N/A")
+            try:
+                parsed = parse_csv_row(row)
+            except RowError as e:
+                results.append({
+                    "student_name": student_name,
+                    "roll_number": roll_number,
+                    "error": str(e)
+                })
+                continue
+            parsed["student_name"] = student_name
+            parsed["roll_number"] = roll_number
+            parsed_rows.append((len(results), parsed))
+            results.append(None)
+    prediction_errors.inc(len(results) - len(parsed_rows), pipeline="batch", stage="parse")
+
+    with stage("batch", "featurize"):
+        features = np.empty((len(parsed_rows), N_FEATURES), dtype=np.float64)
+        for i, (_, parsed) in enumerate(parsed_rows):
+            assemble_features(
+                parsed["attendance"], parsed["avg_assignment"], parsed["prev_cgpa"],
+                parsed["study_hours"], parsed["sleep_hours"], out=features[i],
+            )
+
+    le = bundle.le
+    categories, probabilities, scores = predict_bundle(bundle, features)
+
+    for i, (position, parsed) in enumerate(parsed_rows):
+        pred_proba = probabilities[i]
+        # Determine pass/fail based on average subject marks (>= 40% = PASS)
+        pass_fail = "PASS" if parsed["avg_subject"] >= 40 else "FAIL"
+        results[position] = {
+            "student_name": parsed["student_name"],
+            "roll_number": parsed["roll_number"],
+            "attendance": parsed["attendance"],
+            "avg_assignment_marks": round(parsed["avg_assignment"], 2),
+            "avg_subject_marks": round(parsed["avg_subject"], 2),
+            "prev_cgpa": parsed["prev_cgpa"],
+            "study_hours": parsed["study_hours"],
+            "sleep_hours": parsed["sleep_hours"],
+            "predicted_score": round(float(scores[i]), 2),
+            "predicted_category": str(categories[i]),
+            "pass_fail_status": pass_fail,
+            "probabilities": {
+                str(le.classes_[j]): round(float(pred_proba[j]), 4)
+                for j in range(len(le.classes_))
+            }
+        }
+
+    return results
@@ -1,31 +1,188 @@
+"""
+Non-blocking structured logging.
+
+Request threads only put records on a bounded in-memory queue; a listener
+thread formats them as one JSON object per line and writes them to
+logs/predictions_YYYYMMDD.log, rolling over at midnight and whenever the
+file exceeds LOG_MAX_BYTES. If the queue is full the record is dropped and
+counted rather than making the request wait for the disk.
+
+Large values are truncated before queueing (long lists keep their first
+LOG_MAX_LIST_ITEMS items, long strings LOG_MAX_STRING_LENGTH characters),
+and successful predictions can be sampled with LOG_PREDICTION_SAMPLE_RATE.
+Errors are always logged.
+"""
+
+import json
 import logging
 import os
-from datetime import datetime
+import queue
+import random
+import threading
+from datetime import date, datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from utils.metrics import registry as metrics_registry
+from utils.settings import float_env, int_env
 
-# Create logs directory if it doesn't exist
-os.makedirs("logs", exist_ok=True)
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int_env("LOG_MAX_BYTES", 50 * 1024 * 1024)
+LOG_BACKUP_COUNT = int_env("LOG_BACKUP_COUNT", 10)
+LOG_QUEUE_SIZE = int_env("LOG_QUEUE_SIZE", 10000)
+LOG_MAX_LIST_ITEMS = int_env("LOG_MAX_LIST_ITEMS", 10)
+LOG_MAX_STRING_LENGTH = int_env("LOG_MAX_STRING_LENGTH", 500)
+LOG_PREDICTION_SAMPLE_RATE = float_env("LOG_PREDICTION_SAMPLE_RATE", 1.0)
 
-# Configure logging
-log_file = f"logs/predictions_{datetime.now().strftime('%Y%m%d')}.log"
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+log_records_dropped = metrics_registry.counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full.",
 )
 
-logger = logging.getLogger(__name__)
+
+class DailyRotatingFileHandler(RotatingFileHandler):
+    """Size-rotated log file whose name carries the current date."""
+
+    def __init__(self, directory: str, prefix: str, maxBytes: int = 0, backupCount: int = 0):
+        self.directory = directory
+        self.prefix = prefix
+        self._date = date.today()
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(self._path(self._date), maxBytes=maxBytes, backupCount=backupCount,
+                         encoding="utf-8", delay=True)
+
+    def _path(self, day: date) -> str:
+        return os.path.join(self.directory, f"{self.prefix}_{day.strftime('%Y%m%d')}.log")
+
+    def shouldRollover(self, record) -> bool:
+        if date.today() != self._date:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        today = date.today()
+        if today == self._date:
+            super().doRollover()
+            return
+        # New day: start a new file; the next emit opens it
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self._date = today
+        self.baseFilename = os.path.abspath(self._path(today))
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record."""
+
+    def format(self, record) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "event": getattr(record, "event", None) or "message",
+            "message": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data:
+            entry["data"] = data
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Enqueue without blocking; drop and count records when the queue is full."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only resolve the message here
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Blocking put so the sentinel lands even when the queue is full
+        self.queue.put(self._sentinel)
+
+
+def truncate(value, max_items: int = LOG_MAX_LIST_ITEMS, max_length: int = LOG_MAX_STRING_LENGTH):
+    """Copy value with long lists and strings shortened for logging."""
+    if isinstance(value, dict):
+        return {key: truncate(item, max_items, max_length) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [truncate(item, max_items, max_length) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"... {len(value) - max_items} more")
+        return items
+    if isinstance(value, str) and len(value) > max_length:
+        return value[:max_length] + "..."
+    return value
+
+
+_queue = queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE))
+_listener = None
+_listener_lock = threading.Lock()
+
+logger = logging.getLogger("student_predictor")
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+logger.addHandler(DroppingQueueHandler(_queue))
+
+
+def start_logging():
+    """Start the listener thread that writes queued records to disk."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            handler = DailyRotatingFileHandler(LOG_DIR, "predictions", maxBytes=LOG_MAX_BYTES,
+                                               backupCount=LOG_BACKUP_COUNT)
+            handler.setFormatter(JsonFormatter())
+            _listener = _Listener(_queue, handler, respect_handler_level=True)
+            _listener.start()
+
+
+def stop_logging():
+    """Write out everything still queued and stop the listener thread."""
+    global _listener
+    with _listener_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def _log(level: int, event: str, message: str, data=None):
+    if _listener is None:
+        start_logging()
+    logger.log(level, message, extra={"event": event, "data": truncate(data) if data else None})
+
 
 def log_prediction(record):
     """Log prediction record."""
     try:
-        logger.info(f"Prediction: {record}")
+        if "error" in record:
+            _log(logging.ERROR, "prediction_error", str(record["error"]), record)
+            return
+        if LOG_PREDICTION_SAMPLE_RATE < 1.0 and random.random() >= LOG_PREDICTION_SAMPLE_RATE:
+            return
+        _log(logging.INFO, "prediction", "Prediction", record)
     except Exception as e:
         logger.error(f"Error logging prediction: {e}")
 
-def log_error(error_msg):
+
+def log_error(error_msg, **data):
     """Log error message."""
-    logger.error(error_msg)
+    _log(logging.ERROR, "error", error_msg, data or None)
+
 
-def log_info(info_msg):
+def log_info(info_msg, **data):
     """Log info message."""
-    logger.info(info_msg)
+    _log(logging.INFO, "info", info_msg, data or None)
@@ -0,0 +1,207 @@
+"""
+In-process metrics with a Prometheus text exposition.
+
+Counters and histograms are kept per process and rendered by GET /metrics
+in the Prometheus text format, so any Prometheus-compatible scraper can
+collect them. With several uvicorn workers each process reports its own
+numbers.
+
+Prediction pipeline stages are timed into one histogram labelled by
+pipeline ("single" for /predict/, "batch" for CSV uploads) and stage:
+
+    parse      request marks to percentages / CSV row parsing
+    featurize  writing rows into the feature matrix
+    scale      standardizing the matrix
+    infer      predict_proba plus labels and scores
+    persist    queueing or inserting the MongoDB records
+    log        writing the prediction log
+
+Scale and infer run once per micro-batch on the single pipeline, so their
+samples cover every request in the batch.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.settings import bool_env
+
+METRICS_ENABLED = bool_env("METRICS_ENABLED", True)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a sub-millisecond scale step up to a large CSV upload
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED or amount == 0:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Bucketed distribution of observed values (durations in seconds)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        state = self._values.get(key)
+        return sum(state[:-1]) if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(state[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+prediction_stage_seconds = registry.histogram(
+    "prediction_stage_seconds",
+    "Time spent in each stage of the prediction pipeline.",
+    ("pipeline", "stage"),
+)
+prediction_rows = registry.counter(
+    "prediction_rows_total",
+    "Feature rows scored, including cache hits.",
+    ("pipeline",),
+)
+prediction_errors = registry.counter(
+    "prediction_errors_total",
+    "Failed predictions or rows, by the stage that failed.",
+    ("pipeline", "stage"),
+)
+prediction_cache_hits = registry.counter(
+    "prediction_cache_hits_total",
+    "Rows served from the prediction cache.",
+    ("pipeline",),
+)
+prediction_cache_misses = registry.counter(
+    "prediction_cache_misses_total",
+    "Rows that had to be scaled and scored.",
+    ("pipeline",),
+)
+
+
+def stage(pipeline: str, name: str):
+    """Context manager timing one pipeline stage."""
+    return prediction_stage_seconds.time(pipeline=pipeline, stage=name)
@@ -0,0 +1,173 @@
+"""
+Micro-batching dispatcher for single predictions.
+
+Concurrent requests submit one feature row each; a dispatcher thread
+collects rows for up to a few milliseconds and scores them with a single
+vectorized call, then hands each caller its own row of the result.
+
+The queue is bounded: when MICRO_BATCH_MAX_PENDING rows are waiting,
+submit raises ExecutorBusy like the bounded executors, so /predict/
+answers 503 instead of queueing without limit.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+from utils.executors import inference_executor, ExecutorBusy
+from utils.inference import predict_bundle
+from utils.model_registry import get_bundle
+from utils.settings import bool_env, float_env, int_env
+
+
+class MicroBatcher:
+    """Group concurrent single-row calls into one batched call of fn."""
+
+    _STOP = object()
+
+    def __init__(self, fn: Callable, max_batch_size: int = 64, max_wait_ms: float = 2.0,
+                 enabled: bool = True, name: str = "micro-batcher", executor=None,
+                 max_pending: int = 1000):
+        self.fn = fn
+        # Runs unbatched calls when batching is disabled; None scores inline
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.enabled = enabled
+        self.name = name
+        self.max_pending = max(self.max_batch_size, max_pending)
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "largest_batch": 0, "rejected": 0,
+                       "cancelled": 0, "errors": 0}
+
+    def start(self):
+        """Start the dispatcher thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Finish queued work and stop the dispatcher thread."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join(timeout)
+
+    def submit(self, row) -> Future:
+        """Queue one feature row; the future resolves to fn's result for that row."""
+        if not self.enabled and self.executor is not None:
+            # Batching disabled: score as a batch of one on the executor
+            row = np.array([row], dtype=np.float64)
+            return self.executor.submit(lambda: self.fn(row)[0])
+        future = Future()
+        if not self.enabled:
+            try:
+                future.set_result(self.fn(np.array([row], dtype=np.float64))[0])
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        try:
+            self._queue.put_nowait((row, future))
+        except queue.Full:
+            self._stats["rejected"] += 1
+            raise ExecutorBusy(f"{self.name} is busy ({self.max_pending} rows pending)")
+        return future
+
+    def predict(self, row, timeout: float = None):
+        """Submit a row and wait for its result."""
+        return self.submit(row).result(timeout)
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["average_batch"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["enabled"] = self.enabled
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000
+        stats["pending"] = self._queue.qsize()
+        stats["max_pending"] = self.max_pending
+        return stats
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                # Never let one batch end the loop; its callers get the error
+                self._stats["errors"] += 1
+                print(f"Micro-batch dispatch error: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            if stopping:
+                return
+
+    def _dispatch(self, batch):
+        # Drop rows whose caller has gone away (e.g. the request task was
+        # cancelled); the rest can no longer be cancelled
+        live = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        self._stats["cancelled"] += len(batch) - len(live)
+        if not live:
+            return
+        batch = live
+        # Rows are copied out here, so callers may reuse their row buffers
+        rows = np.empty((len(batch), len(batch[0][0])), dtype=np.float64)
+        for i, (row, _) in enumerate(batch):
+            rows[i] = row
+        try:
+            results = self.fn(rows)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self._stats["requests"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+def _predict_rows(rows):
+    """Score rows with the bundle serving right now; every row in a batch sees the same model."""
+    bundle = get_bundle()
+    if bundle is None:
+        raise RuntimeError("Model not loaded")
+    categories, probabilities, scores = predict_bundle(bundle, rows, pipeline="single")
+    return [(bundle, categories[i], probabilities[i], float(scores[i])) for i in range(len(rows))]
+
+
+prediction_batcher = MicroBatcher(
+    _predict_rows,
+    max_batch_size=int_env("MICRO_BATCH_MAX_SIZE", 64),
+    max_wait_ms=float_env("MICRO_BATCH_MAX_WAIT_MS", 2.0),
+    enabled=bool_env("MICRO_BATCH_ENABLED", True),
+    name="prediction-batcher",
+    executor=inference_executor,
+    max_pending=int_env("MICRO_BATCH_MAX_PENDING", 1000),
+)
@@ -0,0 +1,412 @@
+"""
+Process-wide model registry.
+
+Loads the trained model, scaler and label encoder once and hands the same
+immutable bundle to every router instead of unpickling per request.
+
+Model versions live in model/versions/<version>/ with model.pkl,
+scaler.pkl, label_encoder.pkl and metadata.json. The name of the serving
+version is kept in model/versions/ACTIVE. When no versions exist the flat
+artifacts in model/ are served as version "default".
+
+If a version also has a compiled forest/ directory (see utils.flat_forest),
+it is memory-mapped and served instead of unpickling model.pkl. Likewise
+preprocessing.npz replaces the pickled scaler and encoder, so a fully
+compiled version loads without importing joblib or scikit-learn.
+Compiled artifacts record a digest of the pickles they came from and are
+skipped when those pickles have changed since (utils.artifact_digest).
+
+Every API worker process has its own bundle. activate_version and
+rollback swap the worker that handled the call and record the version in
+ACTIVE; the other workers poll ACTIVE (ActiveVersionWatcher, every
+MODEL_ACTIVE_POLL_SECONDS) and swap themselves when it changes.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+
+from utils.artifact_digest import FOREST_SOURCES, PREPROCESSING_SOURCES, is_current
+from utils.flat_forest import FOREST_DIR, FlatForest, export_forest, forest_source_digest
+from utils.preprocessing import (
+    PREPROCESSING_FILE, export_preprocessing, load_preprocessing, preprocessing_source_digest,
+)
+from utils.settings import bool_env, float_env
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.join(BACKEND_DIR, "model")
+VERSIONS_DIR = os.path.join(MODEL_DIR, "versions")
+ACTIVE_FILE = os.path.join(VERSIONS_DIR, "ACTIVE")
+DEFAULT_VERSION = "default"
+
+USE_FLAT_FOREST = bool_env("FLAT_FOREST_ENABLED", True)
+
+_VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+
+class ModelBundle(NamedTuple):
+    """Loaded model artifacts shared by all routers. Never mutate in place."""
+    model: Any
+    scaler: Any
+    le: Any
+    version: str
+    model_dir: str
+    loaded_at: datetime
+    load_seconds: float
+    memory_bytes: int
+    metadata: dict
+
+
+_bundle: Optional[ModelBundle] = None
+_previous: Optional[ModelBundle] = None
+_lock = threading.Lock()
+_reload_status = {"state": "idle", "version": None, "error": None, "updated_at": None}
+_swap_listeners = []
+
+
+def add_swap_listener(fn):
+    """Register fn(bundle) to be called after a different bundle starts serving."""
+    _swap_listeners.append(fn)
+
+
+def _notify_swap(bundle: ModelBundle):
+    for fn in _swap_listeners:
+        try:
+            fn(bundle)
+        except Exception as e:
+            print(f"Model swap listener error: {e}")
+
+
+def validate_version(version: str) -> str:
+    """Reject version names that could escape the versions directory."""
+    if not version or not _VERSION_PATTERN.match(version):
+        raise ValueError(f"Invalid model version name: {version!r}")
+    return version
+
+
+def version_dir(version: str) -> str:
+    """Directory holding the artifacts of a version."""
+    if version == DEFAULT_VERSION:
+        return MODEL_DIR
+    return os.path.join(VERSIONS_DIR, validate_version(version))
+
+
+def read_metadata(version: str) -> dict:
+    """Read metadata.json for a version, or an empty dict if absent."""
+    path = os.path.join(version_dir(version), "metadata.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def list_versions() -> list:
+    """List every stored model version with its metadata."""
+    versions = []
+    if os.path.exists(os.path.join(MODEL_DIR, "model.pkl")):
+        versions.append({"version": DEFAULT_VERSION, "metadata": {}})
+    if os.path.isdir(VERSIONS_DIR):
+        for name in sorted(os.listdir(VERSIONS_DIR)):
+            path = os.path.join(VERSIONS_DIR, name)
+            if os.path.isdir(path) and _VERSION_PATTERN.match(name):
+                versions.append({"version": name, "metadata": read_metadata(name)})
+    return versions
+
+
+def read_active_version() -> str:
+    """Version recorded as active on disk, falling back to the flat artifacts."""
+    if os.path.exists(ACTIVE_FILE):
+        with open(ACTIVE_FILE) as f:
+            version = f.read().strip()
+        if version:
+            return version
+    return DEFAULT_VERSION
+
+
+def _write_active_version(version: str):
+    """Persist the active version atomically so restarts serve the same model."""
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    tmp_path = ACTIVE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, ACTIVE_FILE)
+
+
+def estimate_nbytes(obj, _seen=None) -> int:
+    """
+    Estimate the memory held by NumPy arrays reachable from a fitted estimator.
+
+    Tree estimators keep their nodes in Cython objects, so those are read
+    through __getstate__, which exposes the underlying node/value arrays.
+    Memory-mapped arrays are excluded since they live in the shared page cache.
+    """
+    if _seen is None:
+        _seen = {}
+    if id(obj) in _seen:
+        return 0
+    # Keep a reference so temporary __getstate__ results are not recycled
+    _seen[id(obj)] = obj
+
+    if isinstance(obj, np.memmap):
+        # File-backed pages are shared between processes, not private memory
+        return 0
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_nbytes(item, _seen) for item in obj)
+    if isinstance(obj, dict):
+        return sum(estimate_nbytes(item, _seen) for item in obj.values())
+    if hasattr(obj, "__dict__"):
+        return estimate_nbytes(vars(obj), _seen)
+    if hasattr(obj, "__getstate__"):
+        try:
+            state = obj.__getstate__()
+        except Exception:
+            return 0
+        if isinstance(state, dict):
+            return estimate_nbytes(state, _seen)
+    return 0
+
+
+def save_version(version: str, model, scaler, le, metadata: Optional[dict] = None,
+                 X_check=None) -> str:
+    """
+    Write a new version directory.
+
+    Artifacts are written to a temporary directory first and renamed into
+    place so a half-written version is never visible to loaders. When
+    X_check (scaled sample rows) is given, the forest is also compiled and
+    verified against it.
+    """
+    import joblib
+
+    target = version_dir(validate_version(version))
+    if version == DEFAULT_VERSION or os.path.exists(target):
+        raise FileExistsError(f"Model version {version} already exists")
+
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    tmp_dir = os.path.join(VERSIONS_DIR, f".{version}.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    joblib.dump(model, os.path.join(tmp_dir, "model.pkl"))
+    joblib.dump(scaler, os.path.join(tmp_dir, "scaler.pkl"))
+    joblib.dump(le, os.path.join(tmp_dir, "label_encoder.pkl"))
+    try:
+        export_preprocessing(scaler, le, tmp_dir)
+    except TypeError as e:
+        print(f"Skipping exported preprocessing for {version}: {e}")
+    if X_check is not None:
+        try:
+            export_forest(model, tmp_dir, X_check)
+        except (TypeError, ValueError) as e:
+            print(f"Skipping compiled forest for {version}: {e}")
+    metadata = dict(metadata or {})
+    metadata.setdefault("created_at", datetime.utcnow().isoformat())
+    with open(os.path.join(tmp_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_dir, target)
+    return target
+
+
+def load_bundle(version: str = DEFAULT_VERSION) -> ModelBundle:
+    """Load a version's artifacts from disk and measure load time and memory."""
+    model_dir = version_dir(version)
+    start = time.perf_counter()
+    forest_path = os.path.join(model_dir, FOREST_DIR)
+    if (USE_FLAT_FOREST and os.path.exists(forest_path)
+            and is_current(model_dir, FOREST_DIR, forest_source_digest(forest_path), FOREST_SOURCES)):
+        model = FlatForest.load(forest_path)
+    else:
+        import joblib
+        model = joblib.load(os.path.join(model_dir, "model.pkl"))
+    if (USE_FLAT_FOREST and os.path.exists(os.path.join(model_dir, PREPROCESSING_FILE))
+            and is_current(model_dir, PREPROCESSING_FILE, preprocessing_source_digest(model_dir),
+                           PREPROCESSING_SOURCES)):
+        scaler, le = load_preprocessing(model_dir)
+    else:
+        # Unpickling these imports scikit-learn, the bulk of a cold start
+        import joblib
+        scaler = joblib.load(os.path.join(model_dir, "scaler.pkl"))
+        le = joblib.load(os.path.join(model_dir, "label_encoder.pkl"))
+    load_seconds = time.perf_counter() - start
+
+    return ModelBundle(
+        model=model,
+        scaler=scaler,
+        le=le,
+        version=version,
+        model_dir=model_dir,
+        loaded_at=datetime.utcnow(),
+        load_seconds=load_seconds,
+        memory_bytes=estimate_nbytes((model, scaler, le)),
+        metadata=read_metadata(version),
+    )
+
+
+def loaded_bundle() -> Optional[ModelBundle]:
+    """The serving bundle if one is already loaded; never triggers a load."""
+    return _bundle
+
+
+def get_bundle() -> Optional[ModelBundle]:
+    """Return the shared model bundle, loading it on first use."""
+    global _bundle
+    bundle = _bundle
+    if bundle is not None:
+        return bundle
+
+    with _lock:
+        if _bundle is None:
+            version = read_active_version()
+            try:
+                _bundle = load_bundle(version)
+                print(f"✓ Model {version} loaded successfully from {_bundle.model_dir} in {_bundle.load_seconds:.3f}s")
+            except Exception as e:
+                print(f"Error loading model: {e}")
+                print(f"Attempted to load version {version} from: {MODEL_DIR}")
+        return _bundle
+
+
+def _set_reload_status(state: str, version: Optional[str], error: Optional[str] = None):
+    _reload_status.update({
+        "state": state,
+        "version": version,
+        "error": error,
+        "updated_at": datetime.utcnow().isoformat(),
+    })
+
+
+def activate_version(version: str, record: bool = True) -> ModelBundle:
+    """
+    Load a version and atomically swap it into the serving path.
+
+    Loading happens outside the lock so requests keep using the current
+    bundle until the new one is fully ready. The replaced bundle is kept
+    warm for rollback. record=False swaps without writing ACTIVE (used by
+    workers following another worker's activation).
+    """
+    global _bundle, _previous
+    validate_version(version)
+    _set_reload_status("loading", version)
+    try:
+        new_bundle = load_bundle(version)
+    except Exception as e:
+        _set_reload_status("failed", version, str(e))
+        print(f"Error loading model version {version}: {e}")
+        raise
+
+    with _lock:
+        _previous, _bundle = _bundle, new_bundle
+        if record:
+            _write_active_version(version)
+    _notify_swap(new_bundle)
+    _set_reload_status("ready", version)
+    print(f"✓ Model {version} activated in {new_bundle.load_seconds:.3f}s")
+    return new_bundle
+
+
+def rollback(record: bool = True) -> ModelBundle:
+    """Swap the warm previous bundle back into service."""
+    global _bundle, _previous
+    with _lock:
+        if _previous is None:
+            raise LookupError("No previous model version is loaded")
+        _bundle, _previous = _previous, _bundle
+        if record:
+            _write_active_version(_bundle.version)
+        bundle = _bundle
+    _notify_swap(bundle)
+    _set_reload_status("ready", bundle.version)
+    print(f"✓ Rolled back to model {bundle.version}")
+    return bundle
+
+
+def sync_active_version() -> Optional[ModelBundle]:
+    """
+    Serve the version recorded in ACTIVE if this worker serves another one.
+
+    Returns the new bundle after a swap, None when nothing changed. A
+    version that failed to load is not retried until ACTIVE changes again.
+    """
+    bundle = _bundle
+    if bundle is None or _reload_status["state"] == "loading":
+        return None
+    version = read_active_version()
+    if version == bundle.version:
+        return None
+    if _reload_status["state"] == "failed" and _reload_status["version"] == version:
+        return None
+    previous = _previous
+    if previous is not None and previous.version == version:
+        return rollback(record=False)
+    return activate_version(version, record=False)
+
+
+class ActiveVersionWatcher:
+    """Background thread that keeps this worker on the version in ACTIVE."""
+
+    def __init__(self, interval: float = 2.0, name: str = "active-version-watcher"):
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                sync_active_version()
+            except Exception as e:
+                print(f"Active model version sync error: {e}")
+
+
+def reload_status() -> dict:
+    """State of the most recent background load."""
+    return dict(_reload_status)
+
+
+def _describe(bundle: Optional[ModelBundle]) -> Optional[dict]:
+    if bundle is None:
+        return None
+    return {
+        "version": bundle.version,
+        "model_dir": bundle.model_dir,
+        "loaded_at": bundle.loaded_at.isoformat(),
+        "load_seconds": round(bundle.load_seconds, 4),
+        "memory_bytes": bundle.memory_bytes,
+        "mapped_bytes": getattr(bundle.model, "mapped_nbytes", 0),
+        "engine": type(bundle.model).__name__,
+        "metadata": bundle.metadata,
+    }
+
+
+def registry_info() -> dict:
+    """Describe the serving and warm standby bundles for health and info endpoints."""
+    bundle, previous = _bundle, _previous
+    if bundle is None:
+        return {"loaded": False, "previous": _describe(previous), "reload": reload_status()}
+    info = {"loaded": True}
+    info.update(_describe(bundle))
+    info["previous"] = _describe(previous)
+    info["reload"] = reload_status()
+    return info
+
+
+# 0 disables polling; only the worker handling an admin call then swaps
+active_version_watcher = ActiveVersionWatcher(float_env("MODEL_ACTIVE_POLL_SECONDS", 2.0))
@@ -0,0 +1,85 @@
+"""
+Keyset (cursor) pagination over MongoDB collections.
+
+Pages are sorted newest first by a timestamp field with _id as tie-break,
+and the next page starts strictly after the last (timestamp, _id) seen.
+Each page is one index range scan no matter how deep the client pages,
+unlike skip/limit, whose cost grows with the offset.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client-supplied cursor cannot be decoded."""
+
+
+def encode_cursor(timestamp: datetime, doc_id) -> str:
+    raw = json.dumps({"t": timestamp.isoformat(), "id": str(doc_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Return (timestamp, ObjectId) from an opaque cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["t"]), ObjectId(data["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def time_range(field: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+    """Filter for start <= field < end; either bound may be omitted."""
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+    return {field: bounds} if bounds else {}
+
+
+def paginate(collection, query: dict, time_field: str, projection: dict, limit: int,
+             cursor: Optional[str] = None) -> dict:
+    """
+    Fetch one page of documents matching query, newest first.
+
+    Returns {"items": [...], "next_cursor": str | None}; items carry their
+    _id as a string "id" field. Only the projected fields are read.
+    """
+    query = dict(query)
+    if cursor:
+        timestamp, doc_id = decode_cursor(cursor)
+        after = {"$or": [
+            {time_field: {"$lt": timestamp}},
+            {time_field: timestamp, "_id": {"$lt": doc_id}},
+        ]}
+        query = {"$and": [query, after]} if query else after
+
+    projection = dict(projection)
+    projection[time_field] = 1
+    documents = list(
+        collection.find(query, projection)
+        .sort([(time_field, DESCENDING), ("_id", DESCENDING)])
+        .limit(limit + 1)
+    )
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last[time_field], last["_id"])
+
+    items = []
+    for document in documents:
+        document["id"] = str(document.pop("_id"))
+        items.append(document)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,97 @@
+"""
+LRU/TTL cache of prediction results.
+
+Entries are keyed by model version plus the rounded feature vector, so
+repeated inputs skip scaling and inference entirely. The cache is cleared
+whenever a different model version is swapped in.
+
+Matrices of more than max_batch_rows rows bypass the cache: a large
+upload is rarely repeated, the per-row lookups cost more than they save
+on a cold run, and its rows would evict the entries /predict/ relies on.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from utils.model_registry import add_swap_listener
+from utils.settings import int_env
+
+
+class PredictionCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600, decimals: int = 6,
+                 max_batch_rows: int = 256):
+        self.max_entries = max(0, max_entries)
+        self.max_batch_rows = max_batch_rows
+        self.ttl_seconds = ttl_seconds
+        self.decimals = decimals
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def accepts(self, n_rows: int) -> bool:
+        """Whether a matrix of n_rows rows should go through the cache."""
+        return self.enabled and n_rows <= self.max_batch_rows
+
+    def key(self, version: str, row) -> tuple:
+        """Canonical key: model version plus the feature vector rounded to a fixed precision."""
+        return (version,) + tuple(round(float(value), self.decimals) for value in row)
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self, *_):
+        """Drop every entry; registered as a model swap listener."""
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["max_batch_rows"] = self.max_batch_rows
+        return stats
+
+
+prediction_cache = PredictionCache(
+    max_entries=int_env("PREDICTION_CACHE_SIZE", 10000),
+    ttl_seconds=int_env("PREDICTION_CACHE_TTL_SECONDS", 3600),
+    decimals=int_env("PREDICTION_CACHE_DECIMALS", 6),
+    max_batch_rows=int_env("PREDICTION_CACHE_MAX_BATCH_ROWS", 256),
+)
+add_swap_listener(prediction_cache.clear)
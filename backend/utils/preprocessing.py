@@ -1,7 +1,88 @@
 """
 Preprocessing utilities for student performance prediction.
+
+The fitted StandardScaler and LabelEncoder can also be exported as plain
+arrays (preprocessing.npz next to model.pkl). Serving from those avoids
+unpickling them, which would otherwise import scikit-learn at startup.
+The export records the digest of the pickles it was taken from, so the
+registry can tell when they have been replaced since.
 """
 
+import os
+
+import numpy as np
+
+from utils.artifact_digest import PREPROCESSING_SOURCES, sources_digest
+
+PREPROCESSING_FILE = "preprocessing.npz"
+
+
+class ArrayScaler:
+    """StandardScaler.transform from its fitted mean_ and scale_ arrays."""
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.n_features_in_ = len(self.mean_)
+
+    def transform(self, X) -> np.ndarray:
+        # Same operations, in the same order, as StandardScaler.transform
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+
+class ArrayLabelEncoder:
+    """LabelEncoder.inverse_transform from its fitted classes_."""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes, dtype=object)
+
+    def inverse_transform(self, y) -> np.ndarray:
+        return self.classes_.take(np.asarray(y, dtype=np.intp))
+
+
+def export_preprocessing(scaler, le, model_dir: str) -> str:
+    """
+    Write the scaler and label encoder parameters to preprocessing.npz.
+
+    scaler.pkl and label_encoder.pkl, when already saved in model_dir, are
+    recorded by digest.
+    """
+    mean = getattr(scaler, "mean_", None)
+    scale = getattr(scaler, "scale_", None)
+    if mean is None or scale is None:
+        raise TypeError(f"Cannot export {type(scaler).__name__}; expected a fitted StandardScaler")
+    path = os.path.join(model_dir, PREPROCESSING_FILE)
+    tmp_path = path + ".tmp.npz"
+    np.savez(
+        tmp_path,
+        scaler_mean=np.asarray(mean, dtype=np.float64),
+        scaler_scale=np.asarray(scale, dtype=np.float64),
+        label_classes=np.asarray([str(c) for c in le.classes_]),
+        source_digest=np.asarray(sources_digest(model_dir, PREPROCESSING_SOURCES) or ""),
+    )
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_preprocessing(model_dir: str):
+    """Load (scaler, label_encoder) written by export_preprocessing."""
+    with np.load(os.path.join(model_dir, PREPROCESSING_FILE), allow_pickle=False) as data:
+        scaler = ArrayScaler(data["scaler_mean"], data["scaler_scale"])
+        le = ArrayLabelEncoder(data["label_classes"].tolist())
+    return scaler, le
+
+
+def preprocessing_source_digest(model_dir: str):
+    """Digest of the pickles preprocessing.npz was exported from, if recorded."""
+    with np.load(os.path.join(model_dir, PREPROCESSING_FILE), allow_pickle=False) as data:
+        if "source_digest" not in data.files:
+            return None
+        return str(data["source_digest"]) or None
+
+
 def validate_input(data):
     """Validate input data."""
     errors = []
@@ -0,0 +1,121 @@
+"""
+Process pool for scoring large feature matrices in parallel.
+
+Inference on a big upload is bound to one core inside a single process,
+so matrices of at least PARALLEL_SCORING_MIN_ROWS rows are split into
+contiguous chunks, scored by worker processes and concatenated back in
+input order.
+
+Each worker keeps the bundle it loaded in a module global and only
+reloads when a task names a different model version, so the model is
+loaded once per worker rather than per chunk. A compiled forest is
+memory-mapped, so the workers share its pages with the API process.
+
+Workers are started with "spawn": forking a process that already runs
+the batcher, writer and logging threads could inherit a held lock.
+
+Every API worker has its own pool, so SCORING_PROCESSES defaults to the
+core count divided by the number of API workers (UVICORN_WORKERS, or
+uvicorn's WEB_CONCURRENCY); with one core per API worker the pool is
+disabled.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import numpy as np
+
+from utils.model_registry import load_bundle
+from utils.settings import int_env
+
+API_WORKERS = max(1, int_env("UVICORN_WORKERS", int_env("WEB_CONCURRENCY", 1)))
+SCORING_PROCESSES = int_env("SCORING_PROCESSES", (os.cpu_count() or 1) // API_WORKERS)
+PARALLEL_SCORING_MIN_ROWS = int_env("PARALLEL_SCORING_MIN_ROWS", 20000)
+
+# Bundle loaded by this worker process; unused in the API process
+_worker_bundle = None
+
+
+def _score_chunk(version: str, features: np.ndarray):
+    """Worker side: score one chunk with the requested model version."""
+    global _worker_bundle
+    from utils.inference import predict_matrix
+
+    if _worker_bundle is None or _worker_bundle.version != version:
+        _worker_bundle = load_bundle(version)
+    bundle = _worker_bundle
+    return predict_matrix(bundle.model, bundle.scaler, bundle.le, features)
+
+
+class ScoringPool:
+    """Lazily started process pool that scores matrix chunks in order."""
+
+    def __init__(self, processes: int, min_rows: int):
+        self.processes = max(1, processes)
+        self.min_rows = max(1, min_rows)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats = {"parallel_batches": 0, "parallel_rows": 0, "fallbacks": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 1
+
+    def should_parallelize(self, n_rows: int) -> bool:
+        return self.enabled and n_rows >= self.min_rows
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def predict(self, bundle, features: np.ndarray):
+        """
+        Score features across the pool; same return value as predict_matrix.
+
+        Chunks are contiguous and results are concatenated in submission
+        order, so row i of the output always belongs to row i of the input.
+        """
+        chunks = np.array_split(features, self.processes)
+        try:
+            executor = self._get_executor()
+            futures = [executor.submit(_score_chunk, bundle.version, chunk) for chunk in chunks]
+            parts = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            # A worker died; drop the pool so the next batch starts a fresh one
+            print(f"Scoring pool failed, scoring in-process: {e}")
+            self.shutdown(wait=False)
+            self._stats["fallbacks"] += 1
+            from utils.inference import predict_matrix
+            return predict_matrix(bundle.model, bundle.scaler, bundle.le, features)
+
+        self._stats["parallel_batches"] += 1
+        self._stats["parallel_rows"] += features.shape[0]
+        categories = np.concatenate([part[0] for part in parts])
+        probabilities = np.concatenate([part[1] for part in parts])
+        scores = np.concatenate([part[2] for part in parts])
+        return categories, probabilities, scores
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["processes"] = self.processes
+        stats["min_rows"] = self.min_rows
+        stats["enabled"] = self.enabled
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+scoring_pool = ScoringPool(SCORING_PROCESSES, PARALLEL_SCORING_MIN_ROWS)
@@ -0,0 +1,29 @@
+"""
+Environment-driven settings helpers.
+"""
+
+import os
+
+
+def int_env(name: str, default: int) -> int:
+    """Read an integer setting, falling back to the default if unset or invalid."""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def float_env(name: str, default: float) -> float:
+    """Read a float setting, falling back to the default if unset or invalid."""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def bool_env(name: str, default: bool) -> bool:
+    """Read a boolean setting such as 1/0, true/false or yes/no."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
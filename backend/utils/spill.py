@@ -0,0 +1,199 @@
+"""
+Durable spill file for MongoDB writes made while the database is down.
+
+Writes that cannot reach MongoDB (the circuit breaker is open or the
+insert failed) are appended to a local JSON-lines file in MongoDB
+extended JSON and fsynced, so they survive a restart. replay() applies
+them in order once the database is back and removes what was written.
+
+Inserted documents get their _id before they are spilled, so a replay
+that is interrupted and repeated skips rows that already made it
+(duplicate key errors are ignored). Operations the database rejects for
+any other reason (e.g. an invalid document) are moved to <path>.bad so
+they cannot block the ones behind them.
+
+Every API worker process shares the file, so appends and the hand-over to
+replay hold an flock on <path>.lock, and only one process replays at a
+time (<path>.replay.lock).
+"""
+
+import os
+import shutil
+from typing import Callable, Optional
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+from utils.file_lock import FileLock
+
+DUPLICATE_KEY = 11000
+
+# Relaxed mode writes doubles as plain JSON numbers, so numpy floats in
+# records serialize like any float
+_JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+class SpillFile:
+    """Append-only file of deferred insert_many / update_one operations."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = FileLock(path + ".lock")
+        self._replay_lock = FileLock(path + ".replay.lock")
+        self._replaying = path + ".replaying"
+        # A .replaying file is left behind when the process stopped mid-replay
+        self._pending = self._count_lines(path) + self._count_lines(self._replaying)
+        self._stats = {"spilled": 0, "replayed": 0, "replay_errors": 0, "discarded": 0}
+
+    @staticmethod
+    def _count_lines(path: str) -> int:
+        try:
+            with open(path, "rb") as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def pending(self) -> int:
+        """Operations spilled by this process and not replayed yet."""
+        return self._pending
+
+    def has_pending(self) -> bool:
+        """Whether any process left operations to replay."""
+        return self._pending > 0 or os.path.exists(self.path) or os.path.exists(self._replaying)
+
+    def _append(self, entries: list):
+        lines = "".join(json_util.dumps(entry, json_options=_JSON_OPTIONS) + "\n" for entry in entries)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending += len(entries)
+            self._stats["spilled"] += len(entries)
+
+    def spill_insert(self, db_name: str, collection: str, documents: list):
+        """Defer insert_many(documents); assigns _id to documents that lack one."""
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+        self._append([{"op": "insert", "db": db_name, "collection": collection, "document": d} for d in documents])
+
+    def spill_update(self, db_name: str, collection: str, query: dict, update: dict):
+        """Defer update_one(query, update)."""
+        self._append([{"op": "update", "db": db_name, "collection": collection, "query": query, "update": update}])
+
+    def replay(self, get_client: Callable, guard: Optional[Callable] = None,
+               transient: tuple = (ConnectionFailure,)) -> int:
+        """
+        Apply spilled operations in order and return how many were written.
+
+        guard(fn, *args) wraps each database call (the circuit breaker).
+        When a call fails with one of the transient errors, the unapplied
+        rest is put back in the spill file and replay stops; operations
+        failing with any other error are moved to the .bad file. Concurrent
+        calls return 0 while one is running.
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+        try:
+            replaying = self._replaying
+            with self._lock:
+                if os.path.exists(self.path):
+                    # Appended after any leftovers of an interrupted replay
+                    with open(self.path, "rb") as source, open(replaying, "ab") as target:
+                        shutil.copyfileobj(source, target)
+                        target.flush()
+                        os.fsync(target.fileno())
+                    os.remove(self.path)
+                self._pending = 0
+                if not os.path.exists(replaying):
+                    return 0
+            entries = self._read_entries(replaying)
+
+            guard = guard or (lambda fn, *args: fn(*args))
+            client = get_client()
+            done = 0
+            discarded = self._stats["discarded"]
+            try:
+                while done < len(entries):
+                    entry = entries[done]
+                    collection = client[entry["db"]][entry["collection"]]
+                    if entry["op"] == "insert":
+                        # Consecutive inserts into one collection go in one call
+                        end = done
+                        while (end < len(entries) and entries[end]["op"] == "insert"
+                               and entries[end]["db"] == entry["db"]
+                               and entries[end]["collection"] == entry["collection"]):
+                            end += 1
+                        try:
+                            guard(_insert_ignoring_duplicates, collection, [e["document"] for e in entries[done:end]])
+                        except transient:
+                            raise
+                        except Exception:
+                            # Retry one by one to find the rejected documents;
+                            # the ones already written count as duplicates
+                            for single in entries[done:end]:
+                                self._apply_or_discard(single, collection, guard, transient)
+                        done = end
+                    else:
+                        self._apply_or_discard(entry, collection, guard, transient)
+                        done += 1
+            except Exception as e:
+                self._stats["replay_errors"] += 1
+                print(f"Spill replay stopped after {done} of {len(entries)} operations: {e}")
+                self._append(entries[done:])
+                self._stats["spilled"] -= len(entries) - done
+            written = done - (self._stats["discarded"] - discarded)
+            self._stats["replayed"] += written
+            os.remove(replaying)
+            if written:
+                print(f"Replayed {written} spilled database operations")
+            return written
+        finally:
+            self._replay_lock.release()
+
+    def _apply_or_discard(self, entry: dict, collection, guard: Callable, transient: tuple):
+        """Apply one operation; a non-transient failure moves it to the .bad file."""
+        try:
+            if entry["op"] == "insert":
+                guard(_insert_ignoring_duplicates, collection, [entry["document"]])
+            else:
+                guard(collection.update_one, entry["query"], entry["update"])
+        except transient:
+            raise
+        except Exception as e:
+            self._stats["discarded"] += 1
+            print(f"Spilled {entry['op']} into {entry['db']}.{entry['collection']} rejected, moved to {self.path}.bad: {e}")
+            with open(self.path + ".bad", "a", encoding="utf-8") as bad:
+                bad.write(json_util.dumps(entry, json_options=_JSON_OPTIONS) + "\n")
+
+    def _read_entries(self, path: str) -> list:
+        """Parse a spill file; unreadable lines are moved aside to <path>.bad."""
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json_util.loads(line, json_options=_JSON_OPTIONS))
+                except ValueError as e:
+                    self._stats["replay_errors"] += 1
+                    print(f"Unreadable spill entry moved to {self.path}.bad: {e}")
+                    with open(self.path + ".bad", "a", encoding="utf-8") as bad:
+                        bad.write(line if line.endswith("\n") else line + "\n")
+        return entries
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["pending"] = self._pending
+        stats["path"] = self.path
+        return stats
+
+
+def _insert_ignoring_duplicates(collection, documents: list):
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
@@ -0,0 +1,434 @@
+"""
+Background model retraining.
+
+POST /train/ starts one training run in a separate process (started with
+"spawn", like the scoring pool), so scikit-learn never holds the API
+process's GIL and serving latency is unaffected. The run:
+
+1. appends labeled records submitted since the last run (the
+   labeled_records collection) to the columnar training dataset,
+2. trains on the dataset, warm-starting from the active forest by adding
+   trees when it is compatible, or training a new forest otherwise,
+3. evaluates on a fixed holdout against the active model, and
+4. saves the result with save_version; it only serves after activation.
+
+The holdout (holdout.npy in the dataset directory) is a persisted row
+mask that each run only extends for rows appended since the last one, so
+rows used to grow the inherited trees never end up in the test set.
+
+The worker reports progress through a queue that a monitor thread in the
+API process turns into the run status. The status is mirrored to
+.training_status.json next to the lock file, so GET /train/status gives
+the same answer on every API worker and after a restart; a run still
+marked running while nobody holds the lock is reported as failed.
+
+Only one run happens at a time across all API workers: the worker that
+starts a run holds an flock on .training.lock in the dataset directory
+until the run ends, and the others answer 409 meanwhile. That also keeps
+the dataset store to a single writer.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+from datetime import datetime
+
+from utils.dataset_store import DEFAULT_DATASET_DIR
+from utils.file_lock import FileLock
+from utils.settings import int_env
+
+LABELED_COLLECTION = "labeled_records"
+
+TRAINING_JOBS = int_env("TRAINING_JOBS", 1)
+TRAINING_NICE = int_env("TRAINING_NICE", 10)
+# New trees added by a warm start; a forest trained from scratch has
+# FOREST_PARAMS["n_estimators"] trees
+WARM_START_TREES = int_env("WARM_START_TREES", 50)
+
+# Same hyperparameters as model/train_model.py
+FOREST_PARAMS = {
+    "n_estimators": 200,
+    "max_depth": 15,
+    "min_samples_split": 5,
+    "min_samples_leaf": 2,
+    "random_state": 42,
+}
+
+# Progress is reported after every TREE_STEPS-th of the new trees
+TREE_STEPS = 20
+
+HOLDOUT_FILE = "holdout.npy"
+# Share of rows held out; also what model/train_model.py uses
+TEST_SIZE = 0.2
+
+
+class TrainingInProgress(RuntimeError):
+    """Raised when a run is requested while another one is still going."""
+
+
+def _report(progress, stage: str, fraction: float, **data):
+    progress.put(dict({"message": None}, **data, stage=stage, progress=round(fraction, 3)))
+
+
+def _ingest_labeled_records(store, run: str) -> int:
+    """
+    Append labeled records not yet in the dataset; returns how many were added.
+
+    Records are first claimed for this run, so a record submitted while the
+    run is appending waits for the next run instead of being half-handled.
+    Claims left by a run that crashed are taken over: the training lock
+    guarantees that no other run is active.
+    """
+    from utils.database import get_database, PREDICTIONS_DB
+    from utils.dataset_store import TRAINING_SCHEMA
+
+    db = get_database(PREDICTIONS_DB)
+    if db is None:
+        raise RuntimeError("Database connection failed")
+    collection = db[LABELED_COLLECTION]
+    collection.update_many({"ingested_at": {"$exists": False}}, {"$set": {"claimed_by": run}})
+    claimed = {"claimed_by": run, "ingested_at": {"$exists": False}}
+    records = list(collection.find(claimed, dict.fromkeys(TRAINING_SCHEMA, 1)))
+    if not records:
+        return 0
+    store.append_records(records)
+    # Marked after the append: a crash in between re-adds these rows next time
+    collection.update_many(claimed, {"$set": {"ingested_at": datetime.utcnow()}})
+    return len(records)
+
+
+def _load_dataset(include_labeled: bool, run: str, progress):
+    from utils.dataset_store import LABEL_COLUMN, convert_json, open_training_dataset
+    from utils.features import FEATURE_NAMES
+
+    legacy_json = os.path.join(os.path.dirname(DEFAULT_DATASET_DIR), "training_data_3000.json")
+    if not os.path.exists(os.path.join(DEFAULT_DATASET_DIR, "manifest.json")) and os.path.exists(legacy_json):
+        _report(progress, "loading_data", 0.0, message="Converting training_data_3000.json")
+        convert_json(legacy_json, DEFAULT_DATASET_DIR)
+    store = open_training_dataset()
+
+    added = 0
+    if include_labeled:
+        try:
+            added = _ingest_labeled_records(store, run)
+        except Exception as e:
+            # Train on the dataset alone rather than failing the run
+            print(f"Labeled record ingestion error: {e}")
+            _report(progress, "loading_data", 0.05, message=f"Skipped labeled records: {e}")
+    if store.n_rows == 0:
+        raise ValueError(f"Training dataset at {DEFAULT_DATASET_DIR} is empty")
+
+    X = store.read_matrix(FEATURE_NAMES)
+    labels = store.read([LABEL_COLUMN])[LABEL_COLUMN]
+    return X, labels, added
+
+
+def _holdout_mask(labels, added: int):
+    """
+    Boolean mask of the rows reserved for evaluation, fixed across runs.
+
+    Rows that were in the dataset before the first run are split exactly
+    like model/train_model.py splits them, so its model is scored on rows
+    it never saw; rows appended later are assigned at random, once.
+    """
+    import numpy as np
+    from sklearn.model_selection import train_test_split
+
+    n_rows = len(labels)
+    path = os.path.join(DEFAULT_DATASET_DIR, HOLDOUT_FILE)
+    mask = np.load(path, allow_pickle=False) if os.path.exists(path) else None
+    if mask is None or len(mask) > n_rows:
+        # No holdout yet, or the dataset was replaced with a smaller one
+        base_rows = n_rows - added
+        mask = np.zeros(base_rows, dtype=bool)
+        if base_rows >= 2:
+            base_labels = labels[:base_rows]
+            _, counts = np.unique(base_labels, return_counts=True)
+            stratify = base_labels if counts.min() >= 2 else None
+            _, test = train_test_split(np.arange(base_rows), test_size=TEST_SIZE, random_state=42,
+                                       stratify=stratify)
+            mask[test] = True
+    if len(mask) < n_rows:
+        rng = np.random.default_rng(len(mask))
+        mask = np.concatenate([mask, rng.random(n_rows - len(mask)) < TEST_SIZE])
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, mask)
+    os.replace(tmp_path, path)
+    return mask
+
+
+def _load_active():
+    """The active version's sklearn model, scaler and encoder (not the compiled forest)."""
+    import joblib
+    from utils.model_registry import read_active_version, version_dir
+
+    version = read_active_version()
+    model_dir = version_dir(version)
+    return (
+        version,
+        joblib.load(os.path.join(model_dir, "model.pkl")),
+        joblib.load(os.path.join(model_dir, "scaler.pkl")),
+        joblib.load(os.path.join(model_dir, "label_encoder.pkl")),
+    )
+
+
+def _evaluate(model, X_test, y_test) -> dict:
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+    y_pred = model.predict(X_test)
+    return {
+        "accuracy": round(float(accuracy_score(y_test, y_pred)), 4),
+        "precision": round(float(precision_score(y_test, y_pred, average="weighted", zero_division=0)), 4),
+        "recall": round(float(recall_score(y_test, y_pred, average="weighted", zero_division=0)), 4),
+        "f1_score": round(float(f1_score(y_test, y_pred, average="weighted", zero_division=0)), 4),
+    }
+
+
+def _train_worker(options: dict, progress):
+    """Training process entry point; every outcome ends with a completed or failed message."""
+    # The active scaler may have been fitted on a DataFrame; rows here are plain arrays
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    try:
+        if TRAINING_NICE > 0 and hasattr(os, "nice"):
+            os.nice(TRAINING_NICE)
+        _run_training(options, progress)
+    except Exception as e:
+        progress.put({"stage": "failed", "error": f"{type(e).__name__}: {e}"})
+
+
+def _run_training(options: dict, progress):
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+    from utils.features import N_FEATURES
+    from utils.model_registry import save_version
+
+    _report(progress, "loading_data", 0.0)
+    X, labels, added = _load_dataset(options["include_labeled"], options["version"], progress)
+    _report(progress, "loading_data", 0.1, samples=len(labels), labeled_records_added=added)
+
+    try:
+        base_version, base_model, base_scaler, base_le = _load_active()
+    except Exception as e:
+        print(f"Active model not available for warm start: {e}")
+        base_version = base_model = base_scaler = base_le = None
+
+    # Warm start keeps the active trees, which only stay valid with the same
+    # scaling and label encoding, so both are reused as they are
+    warm = (
+        options["warm_start"]
+        and isinstance(base_model, RandomForestClassifier)
+        and base_model.n_features_in_ == N_FEATURES
+        and set(np.unique(labels)) <= set(base_le.classes_)
+    )
+
+    holdout = _holdout_mask(labels, added)
+
+    def split(scaler, le):
+        X_scaled, y = scaler.transform(X), le.transform(labels)
+        return X_scaled[~holdout], X_scaled[holdout], y[~holdout], y[holdout]
+
+    if warm:
+        scaler, le = base_scaler, base_le
+        X_train, X_test, y_train, y_test = split(scaler, le)
+        # RandomForest re-derives classes_ from y on every fit; a class
+        # missing from this split would misalign the existing trees
+        warm = len(np.unique(y_train)) == len(le.classes_)
+    if not warm:
+        scaler, le = StandardScaler().fit(X), LabelEncoder().fit(labels)
+        X_train, X_test, y_train, y_test = split(scaler, le)
+
+    if warm:
+        model = base_model
+        start_trees = model.n_estimators
+        target_trees = start_trees + options["add_trees"]
+        model.set_params(warm_start=True, n_jobs=TRAINING_JOBS)
+    else:
+        model = RandomForestClassifier(**dict(FOREST_PARAMS, warm_start=True, n_jobs=TRAINING_JOBS))
+        start_trees = 0
+        target_trees = FOREST_PARAMS["n_estimators"]
+
+    # Grow the forest in steps so progress can be reported between them
+    step = max(1, (target_trees - start_trees) // TREE_STEPS)
+    trees = start_trees
+    while trees < target_trees:
+        trees = min(target_trees, trees + step)
+        model.set_params(n_estimators=trees)
+        model.fit(X_train, y_train)
+        done = (trees - start_trees) / (target_trees - start_trees)
+        _report(progress, "training", 0.1 + 0.7 * done, trees=trees, target_trees=target_trees)
+    model.set_params(warm_start=False, n_jobs=None)
+
+    _report(progress, "evaluating", 0.85)
+    metrics = _evaluate(model, X_test, y_test)
+    baseline = None
+    if base_model is not None and base_model.n_features_in_ == N_FEATURES:
+        try:
+            # Score the active model on the same rows, in its own scaling and labels
+            test_labels = le.inverse_transform(y_test)
+            base_X_test = base_scaler.transform(scaler.inverse_transform(X_test))
+            known = np.isin(test_labels, base_le.classes_)
+            baseline = _evaluate(base_model, base_X_test[known], base_le.transform(test_labels[known]))
+        except Exception as e:
+            print(f"Baseline evaluation error: {e}")
+
+    _report(progress, "saving", 0.9)
+    version = options["version"]
+    metadata = {
+        "trained_by": "retraining",
+        "training_samples": int(len(y_train)),
+        "test_samples": int(len(y_test)),
+        "labeled_records_added": added,
+        "warm_start_from": base_version if warm else None,
+        "n_estimators": int(model.n_estimators),
+        "metrics": metrics,
+        "baseline_metrics": baseline,
+    }
+    save_version(version, model, scaler, le, metadata, X_check=X_test)
+    progress.put({"stage": "completed", "progress": 1.0, "version": version, "metadata": metadata})
+
+
+class Trainer:
+    """Runs at most one training process and tracks its progress."""
+
+    def __init__(self, lock_path: str = os.path.join(DEFAULT_DATASET_DIR, ".training.lock")):
+        self._lock = threading.Lock()
+        self._run_lock = FileLock(lock_path)
+        self._status_path = os.path.join(os.path.dirname(lock_path), ".training_status.json")
+        self._process = None
+        self._status = {"state": "idle"}
+        self._started = 0.0
+
+    def start(self, warm_start: bool = True, add_trees: int = WARM_START_TREES,
+              include_labeled: bool = True, activate: bool = False) -> dict:
+        with self._lock:
+            if self._status.get("state") == "running":
+                raise TrainingInProgress("A training run is already in progress")
+            # Held until _monitor sees the run end; another worker may hold it
+            if not self._run_lock.acquire(blocking=False):
+                raise TrainingInProgress("A training run is already in progress in another worker")
+            try:
+                return self._start(warm_start, add_trees, include_labeled, activate)
+            except Exception:
+                self._run_lock.release()
+                raise
+
+    def _start(self, warm_start: bool, add_trees: int, include_labeled: bool, activate: bool) -> dict:
+        """Launch the training process; called with the run lock held."""
+        version = "retrain-" + datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        options = {
+            "version": version,
+            "warm_start": warm_start,
+            "add_trees": max(1, add_trees),
+            "include_labeled": include_labeled,
+        }
+        context = multiprocessing.get_context("spawn")
+        progress = context.Queue()
+        process = context.Process(target=_train_worker, args=(options, progress),
+                                  name="model-training", daemon=True)
+        process.start()
+        self._process = process
+        self._status = {
+            "state": "running",
+            "stage": "starting",
+            "progress": 0.0,
+            "version": version,
+            "options": dict(options, activate=activate),
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+            "error": None,
+        }
+        self._started = time.monotonic()
+        self._write_status()
+        threading.Thread(target=self._monitor, args=(process, progress, activate),
+                         name="training-monitor", daemon=True).start()
+        return dict(self._status)
+
+    def _monitor(self, process, progress, activate: bool):
+        final = None
+        while final is None:
+            try:
+                message = progress.get(timeout=1.0)
+            except Exception:
+                if not process.is_alive():
+                    final = {"stage": "failed", "error": f"Training process exited with code {process.exitcode}"}
+                continue
+            if message["stage"] in ("completed", "failed"):
+                final = message
+            else:
+                with self._lock:
+                    self._status.update(message)
+                    self._write_status()
+        process.join(timeout=10)
+
+        with self._lock:
+            self._status.update(final)
+            self._status["state"] = final["stage"]
+            self._status["finished_at"] = datetime.utcnow().isoformat()
+            self._process = None
+            # Written before the lock is released, so nobody reads a stale "running"
+            self._write_status()
+        self._run_lock.release()
+        if final["stage"] == "completed":
+            print(f"✓ Retrained model saved as {final['version']}")
+            if activate:
+                from utils.model_registry import activate_version
+                try:
+                    activate_version(final["version"])
+                except Exception as e:
+                    print(f"Activation of {final['version']} failed: {e}")
+        else:
+            print(f"Model training failed: {final.get('error')}")
+
+    def _write_status(self):
+        """Mirror the run status for the other workers; called with self._lock held."""
+        try:
+            tmp_path = self._status_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._status, f, default=str)
+            os.replace(tmp_path, self._status_path)
+        except OSError as e:
+            print(f"Training status write error: {e}")
+
+    def _read_status(self) -> dict:
+        """Status of the last run started by any worker."""
+        try:
+            with open(self._status_path) as f:
+                status = json.load(f)
+        except FileNotFoundError:
+            return {"state": "idle"}
+        except (OSError, ValueError) as e:
+            print(f"Training status read error: {e}")
+            return {"state": "idle"}
+        if status.get("state") == "running" and self._run_lock.acquire(blocking=False):
+            # The worker running it would hold the lock until it recorded the outcome
+            self._run_lock.release()
+            status.update(state="failed", stage="failed", finished_at=None,
+                          error="Interrupted: the worker running training stopped")
+        return status
+
+    def status(self) -> dict:
+        with self._lock:
+            if self._status.get("state") == "running":
+                status = dict(self._status)
+                status["elapsed_seconds"] = round(time.monotonic() - self._started, 1)
+                return status
+        status = self._read_status()
+        if status.get("state") == "running" and status.get("started_at"):
+            started_at = datetime.fromisoformat(status["started_at"])
+            status["elapsed_seconds"] = round((datetime.utcnow() - started_at).total_seconds(), 1)
+        return status
+
+    def shutdown(self):
+        """Stop a running training process (on application shutdown)."""
+        with self._lock:
+            process = self._process
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+
+
+trainer = Trainer()
@@ -0,0 +1,195 @@
+"""
+Buffered write-behind queue for MongoDB inserts.
+
+Requests hand records to the queue and return immediately; a background
+thread batches them into insert_many calls once a batch fills up or the
+flush interval passes. The queue is bounded, so a slow database causes
+records to be rejected (and counted) rather than memory to grow.
+
+Inserts run behind the database circuit breaker. A batch that cannot
+reach MongoDB is handed to the spill callback (the durable spill file)
+instead of being dropped, and is replayed once the database is back.
+Batches the database rejects (e.g. an invalid document) are not spilled;
+they are counted as failed and logged.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from pymongo.errors import ConnectionFailure
+
+from utils.circuit_breaker import CircuitOpen
+from utils.database import get_client, db_call, spill_file, PREDICTIONS_DB, UNAVAILABLE_ERRORS
+from utils.settings import int_env
+
+
+class WriteBehindQueue:
+    """Batch inserts into a collection on a size/time threshold."""
+
+    _STOP = object()
+
+    def __init__(self, get_collection: Callable, max_batch: int = 100,
+                 flush_interval: float = 0.5, max_queue: int = 10000, name: str = "writer",
+                 spill: Optional[Callable[[list], None]] = None):
+        self.get_collection = get_collection
+        self.spill = spill
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.name = name
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "spilled": 0,
+            "rejected": 0,
+            "batches": 0,
+            "high_water": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    def start(self):
+        """Start the background writer thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, record: dict) -> bool:
+        """
+        Queue a record for insertion without blocking.
+
+        Returns False when the queue is full; the record is dropped and
+        counted as rejected so callers never wait on the database.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._bump("rejected")
+            return False
+        self._bump("enqueued")
+        depth = self._queue.qsize()
+        if depth > self._stats["high_water"]:
+            self._stats["high_water"] = depth
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything still queued and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            # Nothing is consuming the queue; write leftovers synchronously
+            self._write(self._drain())
+            return
+        # Blocking put so the sentinel lands even when the queue is full
+        self._queue.put(self._STOP)
+        thread.join(timeout)
+
+    def stats(self) -> dict:
+        """Throughput and backpressure counters."""
+        stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        return stats
+
+    def _bump(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _drain(self) -> list:
+        records = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return records
+            if item is not self._STOP:
+                records.append(item)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is self._STOP:
+                self._write(self._drain())
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+            if stopping:
+                self._write(self._drain())
+                return
+
+    def _write(self, batch: list):
+        """Insert one batch; failures are counted and logged, never raised."""
+        for start in range(0, len(batch), self.max_batch):
+            chunk = batch[start:start + self.max_batch]
+            began = time.perf_counter()
+            try:
+                collection = self.get_collection()
+                if collection is None:
+                    raise ConnectionFailure("Database connection failed")
+                db_call(collection.insert_many, chunk, ordered=False)
+                self._bump("written", len(chunk))
+            except UNAVAILABLE_ERRORS as e:
+                if not self._spill(chunk):
+                    self._bump("failed", len(chunk))
+                if not isinstance(e, CircuitOpen):
+                    print(f"MongoDB insert error ({self.name}): {e}")
+            except Exception as e:
+                # Spilling would only replay the same rejection
+                self._bump("failed", len(chunk))
+                print(f"MongoDB insert rejected ({self.name}), {len(chunk)} records dropped: {e}")
+            self._bump("batches")
+            self._stats["last_batch_size"] = len(chunk)
+            self._stats["last_flush_ms"] = round((time.perf_counter() - began) * 1000, 2)
+
+    def _spill(self, chunk: list) -> bool:
+        if self.spill is None:
+            return False
+        try:
+            self.spill(chunk)
+        except Exception as e:
+            print(f"Spill error ({self.name}): {e}")
+            return False
+        self._bump("spilled", len(chunk))
+        return True
+
+
+def _predictions_collection():
+    # Straight from the client: while the breaker is open, db_call short-circuits
+    # the insert and the batch is spilled
+    return get_client()[PREDICTIONS_DB]["predictions"]
+
+
+prediction_writer = WriteBehindQueue(
+    _predictions_collection,
+    max_batch=int_env("PREDICTION_WRITE_BATCH_SIZE", 100),
+    flush_interval=int_env("PREDICTION_WRITE_INTERVAL_MS", 500) / 1000,
+    max_queue=int_env("PREDICTION_WRITE_QUEUE_SIZE", 10000),
+    name="prediction-writer",
+    spill=lambda records: spill_file.spill_insert(PREDICTIONS_DB, "predictions", records),
+)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+"""
+API latency and throughput benchmarks.
+
+Runs the FastAPI app in-process against an in-memory mongomock database
+and measures the prediction, CSV upload and login endpoints. Each run is
+saved to benchmarks/results/<commit>.json so runs can be compared across
+commits.
+
+Fixtures: test_payload.json is the /predict/ request template, and the
+records in database/training_data_3000.json supply the varied inputs
+and the rows of the generated CSV files.
+
+Usage (from the repository root):
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_api.py
+    python benchmarks/bench_api.py --only predict --requests 2000 --concurrency 16
+    python benchmarks/bench_api.py --csv-rows 100 1000 10000 100000
+    python benchmarks/bench_api.py --compare
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+PAYLOAD_FILE = os.path.join(ROOT_DIR, "test_payload.json")
+TRAINING_DATA_FILE = os.path.join(ROOT_DIR, "database", "training_data_3000.json")
+
+SCENARIOS = ("predict", "upload_csv", "login")
+TEACHER_EMAIL = "bench.teacher@example.com"
+TEACHER_PASSWORD = "benchmark-password"
+
+
+def load_fixtures():
+    with open(PAYLOAD_FILE) as f:
+        payload = json.load(f)
+    with open(TRAINING_DATA_FILE) as f:
+        records = json.load(f)
+    return payload, records
+
+
+def predict_payloads(template, records, count):
+    """Vary the template with training records so the cache sees realistic misses."""
+    payloads = []
+    for i in range(count):
+        record = records[i % len(records)]
+        payload = json.loads(json.dumps(template))
+        payload.update({
+            "attendance": record["attendance"],
+            "prev_cgpa": min(10, record["prev_cgpa"]),
+            "study_hours": record["study_hours"],
+            "sleep_hours": record["sleep_hours"],
+        })
+        for assignment in payload["assignments"]:
+            assignment["marks_obtained"] = record["assignment_score"] * assignment["marks_total"] / 100
+        for subject in payload["subjects"]:
+            subject["marks_obtained"] = min(100, record["final_score"]) * subject["marks_total"] / 100
+        payloads.append(payload)
+    return payloads
+
+
+def make_csv(records, n_rows) -> bytes:
+    """Generate an upload in the template layout by cycling training records."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([
+        "student_name", "roll_number", "attendance", "prev_cgpa", "study_hours", "sleep_hours",
+        "subject1_marks", "subject2_marks", "assignment1_marks", "assignment2_marks",
+    ])
+    for i in range(n_rows):
+        record = records[i % len(records)]
+        score = min(100, record["final_score"])
+        writer.writerow([
+            f"Student {i}", f"R{i:06d}", record["attendance"], min(10, record["prev_cgpa"]),
+            record["study_hours"], record["sleep_hours"],
+            score, max(0, score - 5), record["assignment_score"], max(0, record["assignment_score"] - 3),
+        ])
+    return out.getvalue().encode()
+
+
+def current_rss_mb():
+    """Current RSS of this process in MB, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+class RssSampler:
+    """
+    Peak RSS while one scenario runs, sampled on a background thread.
+
+    ru_maxrss is the high-water mark of the whole process, so every scenario
+    after the largest upload would report that upload's peak; the sampler
+    reports each scenario's own peak and its growth over the starting RSS.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None:
+            self.peak_mb = max(self.peak_mb or rss, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = current_rss_mb()
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+
+    def summary(self) -> dict:
+        if self.start_mb is None:
+            return {"peak_rss_mb": None, "rss_delta_mb": None}
+        return {
+            "peak_rss_mb": round(self.peak_mb, 1),
+            "rss_delta_mb": round(self.peak_mb - self.start_mb, 1),
+        }
+
+
+def summarize(latencies, rows=None, wall_seconds=None, rss=None):
+    """
+    Latency percentiles in milliseconds plus throughput.
+
+    Throughput is based on wall-clock time, so concurrent requests are not
+    counted as if they had run one after another.
+    """
+    latencies_ms = np.asarray(latencies) * 1000
+    summary = {
+        "count": len(latencies),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "max_ms": round(float(latencies_ms.max()), 3),
+    }
+    if wall_seconds:
+        summary["requests_per_sec"] = round(len(latencies) / wall_seconds, 1)
+        if rows is not None:
+            summary["rows_per_sec"] = round(rows * len(latencies) / wall_seconds, 1)
+    if rss is not None:
+        summary.update(rss.summary())
+    return summary
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    response = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.url} returned {response.status_code}: {response.text[:200]}")
+    return elapsed
+
+
+def bench_predict(client, template, records, n_requests, concurrency):
+    payloads = predict_payloads(template, records, n_requests)
+    # Warm up the model and the micro-batcher thread
+    timed(client.post, "/predict/", json=payloads[0])
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                latencies = list(pool.map(lambda p: timed(client.post, "/predict/", json=p), payloads))
+        else:
+            latencies = [timed(client.post, "/predict/", json=p) for p in payloads]
+        wall_seconds = time.perf_counter() - start
+    result = summarize(latencies, rows=1, wall_seconds=wall_seconds, rss=rss)
+    result["concurrency"] = concurrency
+    return result
+
+
+def bench_upload_csv(client, records, sizes, repeat, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    for n_rows in sizes:
+        data = make_csv(records, n_rows)
+        with RssSampler() as rss:
+            start = time.perf_counter()
+            latencies = [
+                timed(client.post, "/teacher/upload/csv", headers=headers,
+                      files={"file": (f"bench_{n_rows}.csv", data, "text/csv")})
+                for _ in range(repeat)
+            ]
+            wall_seconds = time.perf_counter() - start
+        results[str(n_rows)] = summarize(latencies, rows=n_rows, wall_seconds=wall_seconds, rss=rss)
+        results[str(n_rows)]["file_bytes"] = len(data)
+        print(f"  upload_csv {n_rows:>7} rows: p50 {results[str(n_rows)]['p50_ms']:.1f} ms, "
+              f"{results[str(n_rows)]['rows_per_sec']:.0f} rows/s")
+    return results
+
+
+def bench_login(client, n_requests):
+    client.post("/teacher/register", json={
+        "email": TEACHER_EMAIL, "password": TEACHER_PASSWORD, "full_name": "Bench Teacher",
+    })
+    credentials = {"email": TEACHER_EMAIL, "password": TEACHER_PASSWORD}
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        latencies = [timed(client.post, "/teacher/login", json=credentials) for _ in range(n_requests)]
+        wall_seconds = time.perf_counter() - start
+    return summarize(latencies, wall_seconds=wall_seconds, rss=rss)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(report) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def latest_baseline(exclude_path):
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    candidates = [
+        os.path.join(RESULTS_DIR, name) for name in os.listdir(RESULTS_DIR)
+        if name.endswith(".json") and os.path.join(RESULTS_DIR, name) != exclude_path
+    ]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def _flatten(scenarios):
+    """Map 'scenario[/size]' to its summary dict."""
+    flat = {}
+    for name, result in scenarios.items():
+        if name == "upload_csv":
+            for size, summary in result.items():
+                flat[f"upload_csv/{size}"] = summary
+        else:
+            flat[name] = result
+    return flat
+
+
+def print_comparison(report, baseline):
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+    current, previous = _flatten(report["scenarios"]), _flatten(baseline["scenarios"])
+    for name, summary in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "rows_per_sec"):
+            if metric in summary and old.get(metric):
+                delta = (summary[metric] - old[metric]) / old[metric] * 100
+                changes.append(f"{metric} {summary[metric]:.1f} ({delta:+.1f}%)")
+        print(f"  {name:<18} " + ", ".join(changes))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Student Performance Predictor API")
+    parser.add_argument("--only", choices=SCENARIOS, nargs="+", help="Scenarios to run (default: all)")
+    parser.add_argument("--requests", type=int, default=500, help="Requests for the /predict/ scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="Client threads for /predict/")
+    parser.add_argument("--csv-rows", type=int, nargs="+", default=[100, 1000, 10000, 100000],
+                        help="Generated CSV sizes for /teacher/upload/csv")
+    parser.add_argument("--csv-repeat", type=int, default=3, help="Uploads per CSV size")
+    parser.add_argument("--logins", type=int, default=20, help="Requests for /teacher/login")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the prediction cache")
+    parser.add_argument("--compare", nargs="?", const="latest", metavar="RESULT_JSON",
+                        help="Compare with a saved result (default: the most recent other run)")
+    parser.add_argument("--no-save", action="store_true", help="Do not write a results file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scenarios = args.only or SCENARIOS
+    if args.no_cache:
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+
+    # mongomock checks unique indexes by scanning the collection, which makes
+    # every insert into batch_results O(n); the indexes only matter on a real mongod
+    os.environ["MONGO_CREATE_INDEXES"] = "false"
+
+    import mongomock
+
+    # Serve from an in-memory database; the app must not need a real MongoDB
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    import utils.database
+    utils.database.MongoClient = mongomock.MongoClient
+
+    from fastapi.testclient import TestClient
+    from main import app
+    from utils.jwt_handler import create_access_token
+
+    template, records = load_fixtures()
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "scenarios": {},
+    }
+
+    with TestClient(app) as client:
+        if "predict" in scenarios:
+            print(f"Benchmarking /predict/ ({args.requests} requests, concurrency {args.concurrency})...")
+            report["scenarios"]["predict"] = bench_predict(
+                client, template, records, args.requests, args.concurrency)
+        if "upload_csv" in scenarios:
+            print("Benchmarking /teacher/upload/csv...")
+            token = create_access_token({"email": TEACHER_EMAIL})
+            report["scenarios"]["upload_csv"] = bench_upload_csv(
+                client, records, sorted(args.csv_rows), args.csv_repeat, token)
+        if "login" in scenarios:
+            print(f"Benchmarking /teacher/login ({args.logins} requests)...")
+            report["scenarios"]["login"] = bench_login(client, args.logins)
+
+    print(json.dumps(report["scenarios"], indent=2))
+
+    path = None
+    if not args.no_save:
+        path = save_results(report)
+        print(f"\n✓ Results saved to {os.path.relpath(path, ROOT_DIR)}")
+
+    if args.compare:
+        baseline_path = latest_baseline(path) if args.compare == "latest" else args.compare
+        if baseline_path and os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                print_comparison(report, json.load(f))
+        else:
+            print("No earlier results to compare with")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ function Dashboard() {
   const [uploading, setUploading] = useState(false);
   const [uploadError, setUploadError] = useState('');
   const [uploadSuccess, setUploadSuccess] = useState('');
+  const [uploadProgress, setUploadProgress] = useState(null);
   const [batchResults, setBatchResults] = useState(null);
   const [showResults, setShowResults] = useState(false);
 
@@ -83,7 +84,24 @@ function Dashboard() {
     setUploadSuccess('');
 
     try {
-      const response = await api.uploadCSV(csvFile, token);
+      // Queue the upload as a background job and poll until it finishes
+      const jobResponse = await api.createUploadJob(csvFile, token);
+      const jobId = jobResponse.data.job_id;
+      setUploadProgress(jobResponse.data);
+
+      let job = jobResponse.data;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const statusResponse = await api.getUploadJob(jobId, token);
+        job = statusResponse.data;
+        setUploadProgress(job);
+      }
+
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Processing failed');
+      }
+
+      const response = await api.getUploadJobResults(jobId, token);
       setUploadSuccess(
         `✅ Successfully processed ${response.data.total_processed} students!`
       );
@@ -97,10 +115,12 @@ function Dashboard() {
     } catch (error) {
       const errorMessage =
         error.response?.data?.detail ||
+        error.message ||
         'Failed to upload CSV. Please check the file format.';
       setUploadError(errorMessage);
     } finally {
       setUploading(false);
+      setUploadProgress(null);
     }
   };
 
@@ -152,6 +172,11 @@ function Dashboard() {
   };
 
   const handleLogout = () => {
+    const token = localStorage.getItem('teacherToken');
+    if (token) {
+      // Revoke the token server-side; leave the page even if this fails
+      api.teacherLogout(token).catch(() => {});
+    }
     localStorage.removeItem('teacherToken');
     localStorage.removeItem('teacherEmail');
     navigate('/teacher/login');
@@ -284,6 +309,30 @@ function Dashboard() {
             >
               {uploading ? 'Processing...' : ' Upload & Process'}
             </button>
+
+            {uploading && uploadProgress && (
+              <div>
+                <div className={`w-full rounded-full h-2 ${
+                  isDarkMode ? 'bg-gray-700' : 'bg-gray-200'
+                }`}>
+                  <div
+                    className="bg-gradient-to-r from-blue-600 to-indigo-600 h-2 rounded-full transition-all"
+                    style={{ width: `${uploadProgress.percent || 0}%` }}
+                  />
+                </div>
+                <p className={`text-sm mt-2 ${
+                  isDarkMode ? 'text-gray-400' : 'text-gray-500'
+                }`}>
+                  {uploadProgress.status === 'queued'
+                    ? 'Waiting for a worker...'
+                    : `Processed ${uploadProgress.rows_done} of ${uploadProgress.rows_total} rows`}
+                  {uploadProgress.errors > 0 && ` (${uploadProgress.errors} errors)`}
+                  {uploadProgress.eta_seconds != null &&
+                    uploadProgress.status === 'running' &&
+                    ` · about ${Math.ceil(uploadProgress.eta_seconds)}s left`}
+                </p>
+              </div>
+            )}
           </form>
         </div>
 
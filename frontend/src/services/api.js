@@ -45,6 +45,12 @@ export const getTeacherInfo = (token) => {
   });
 };
 
+export const teacherLogout = (token) => {
+  return API.post('/teacher/logout', null, {
+    headers: { Authorization: `Bearer ${token}` },
+  });
+};
+
 // Teacher CSV Upload
 export const uploadCSV = (file, token) => {
   const formData = new FormData();
@@ -57,6 +63,31 @@ export const uploadCSV = (file, token) => {
   });
 };
 
+// Background CSV jobs: upload returns a job id, then poll for progress
+export const createUploadJob = (file, token) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  return API.post('/teacher/upload/jobs', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+      Authorization: `Bearer ${token}`,
+    },
+  });
+};
+
+export const getUploadJob = (jobId, token) => {
+  return API.get(`/teacher/upload/jobs/${jobId}`, {
+    headers: { Authorization: `Bearer ${token}` },
+  });
+};
+
+export const getUploadJobResults = (jobId, token) => {
+  return API.get(`/teacher/upload/jobs/${jobId}/result`, {
+    params: { format: 'json' },
+    headers: { Authorization: `Bearer ${token}` },
+  });
+};
+
 export const downloadCSVTemplate = () => {
   return API.get('/teacher/upload/download-template');
 };
@@ -19,11 +19,14 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.svm import SVC
 import xgboost as xgb
 import joblib
-import json
+import shutil
 import warnings
 import os
 import sys
 
+sys.path.insert(0, os.path.abspath("../backend"))
+from utils.dataset_store import DatasetStore, TRAINING_SCHEMA, performance_category
+
 warnings.filterwarnings('ignore')
 
 print("=" * 60)
@@ -61,18 +64,8 @@ df['final_score'] = (
 
 df['final_score'] = df['final_score'].clip(0, 100).round(2)
 
-# Categorize performance with adjusted thresholds for better distribution
-def categorize_performance(score):
-    if score < 50:
-        return 'Poor'
-    elif score < 65:
-        return 'Average'
-    elif score < 80:
-        return 'Good'
-    else:
-        return 'Excellent'
-
-df['performance'] = df['final_score'].apply(categorize_performance)
+# Categorize performance (thresholds shared with retraining in the backend)
+df['performance'] = df['final_score'].apply(performance_category)
 
 print(f"✓ Generated {n_samples} samples")
 print(f"\nDataset Info:")
@@ -87,13 +80,23 @@ print(f"\nDataset Shape: {df.shape}")
 print("\n[2/9] Saving dataset to database folder...")
 os.makedirs("../database", exist_ok=True)
 
-# Save as JSON file
-training_data = df.to_dict('records')
-with open('../database/training_data_3000.json', 'w') as f:
-    json.dump(training_data, f, indent=2)
-
-print(f"✓ Saved training_data_3000.json to database folder")
-print(f"  File contains {len(training_data)} student records")
+# Save as a columnar dataset (one memory-mappable .npy file per column)
+# An existing dataset may hold labeled records appended by retraining in the
+# backend (already marked ingested in MongoDB), so it is only replaced on
+# request; the model below is trained on the generated samples either way
+dataset_dir = "../database/training_data"
+if os.path.exists(os.path.join(dataset_dir, "manifest.json")) and "--force" not in sys.argv[1:]:
+    dataset = DatasetStore(dataset_dir, TRAINING_SCHEMA)
+    print(f"✓ Keeping existing dataset in {dataset_dir} ({dataset.n_rows} records)")
+    print("  Re-run with --force to replace it with the generated dataset.")
+else:
+    if os.path.exists(dataset_dir):
+        print(f"  Replacing existing {dataset_dir}")
+        shutil.rmtree(dataset_dir)
+    dataset = DatasetStore(dataset_dir, TRAINING_SCHEMA)
+    dataset.append({name: df[name].to_numpy() for name in TRAINING_SCHEMA})
+    print(f"✓ Saved training_data/ to database folder")
+    print(f"  Dataset contains {dataset.n_rows} student records")
 
 # ============================================
 # STEP 3: Exploratory Data Analysis
@@ -215,16 +218,39 @@ print(cm)
 # ============================================
 print("\n💾 Saving models and preprocessors...")
 
-# Create model directory if it doesn't exist
-os.makedirs("../backend/model", exist_ok=True)
-
-joblib.dump(best_model, "../backend/model/model.pkl")
-joblib.dump(scaler, "../backend/model/scaler.pkl")
-joblib.dump(le, "../backend/model/label_encoder.pkl")
+# Every artifact is written to a staging directory first and moved into
+# place only once all of them exist, so a failed export leaves the previous
+# model intact. The compiled forest and preprocessing.npz record digests
+# of the pickles, so the API serves the pickles while files are being swapped.
+from utils.flat_forest import FOREST_DIR, export_forest
+from utils.preprocessing import PREPROCESSING_FILE, export_preprocessing
+
+model_dir = "../backend/model"
+staging_dir = os.path.join(model_dir, ".staging")
+if os.path.exists(staging_dir):
+    shutil.rmtree(staging_dir)
+os.makedirs(staging_dir)
+
+joblib.dump(best_model, os.path.join(staging_dir, "model.pkl"))
+joblib.dump(scaler, os.path.join(staging_dir, "scaler.pkl"))
+joblib.dump(le, os.path.join(staging_dir, "label_encoder.pkl"))
+
+# Compile the forest into memory-mappable flat arrays for fast serving (verified against predict_proba)
+export_forest(best_model, staging_dir, X_scaled)
+export_preprocessing(scaler, le, staging_dir)
+
+for name in ("model.pkl", "scaler.pkl", "label_encoder.pkl", PREPROCESSING_FILE, FOREST_DIR):
+    target = os.path.join(model_dir, name)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.replace(os.path.join(staging_dir, name), target)
+os.rmdir(staging_dir)
 
 print(f"✓ Saved model.pkl")
 print(f"✓ Saved scaler.pkl")
 print(f"✓ Saved label_encoder.pkl")
+print(f"✓ Saved forest/ (compiled forest, verified bit-for-bit)")
+print(f"✓ Saved preprocessing.npz (scaler and label encoder arrays)")
 
 print("\n" + "=" * 60)
 print("✅ MODEL TRAINING COMPLETED SUCCESSFULLY!")
@@ -239,7 +265,8 @@ print("\nThe following files have been created:")
 print("  • backend/model/model.pkl - Trained Random Forest model")
 print("  • backend/model/scaler.pkl - Feature scaler")
 print("  • backend/model/label_encoder.pkl - Performance label encoder")
-print("  • database/training_data_3000.json - 3000 training samples")
+print("  • backend/model/forest/ - Compiled, memory-mapped forest used for serving")
+print(f"  • database/training_data/ - {dataset.n_rows} training samples (columnar dataset)")
 print("\nYou can now run the FastAPI server with:")
 print("  cd backend && uvicorn main:app --reload")
 print("=" * 60)